@@ -0,0 +1,139 @@
+import subprocess
+import threading
+import time
+from collections import deque, namedtuple
+import numpy as np
+
+SAMPLE_RATE = 22050
+HOP = 512  # samples per analysis frame (~23 ms)
+WINDOW = 2048
+NUM_BANDS = 16
+LOOKAHEAD = 0.2  # seconds decoded ahead of playback
+RESYNC = 0.25  # drift (seconds) that forces a decoder restart, e.g. after a seek
+
+AnalysisFrame = namedtuple("AnalysisFrame", ["position", "level", "bands", "onset"])
+SILENCE = AnalysisFrame(0.0, 0.0, np.zeros(NUM_BANDS), False)
+
+
+def band_edges(bands=NUM_BANDS, low=40.0, high=10000.0):
+    freqs = np.fft.rfftfreq(WINDOW, 1 / SAMPLE_RATE)
+    edges = np.geomspace(low, high, bands + 1)
+    return np.searchsorted(freqs, edges)
+
+
+class SpectrumAnalyzer:
+    # Decodes the playing track with ffmpeg just ahead of the playhead and publishes
+    # the frame matching Player.get_elapsed() into self.latest. The slot is only ever
+    # replaced, never mutated, so readers need no lock.
+    def __init__(self, player):
+        self.player = player
+        self.latest = SILENCE
+        self._edges = band_edges()
+        self._window = np.hanning(WINDOW).astype(np.float32)
+        self._running = False
+        self._thread = None
+        self._process = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="spectrum", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self.latest = SILENCE
+
+    def _open(self, path, offset):
+        self._close()
+        try:
+            self._process = subprocess.Popen(
+                ["ffmpeg", "-v", "error", "-ss", f"{offset:.3f}", "-i", str(path),
+                 "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"],
+                stdout=subprocess.PIPE, stdin=subprocess.DEVNULL, bufsize=HOP * 8,
+            )
+        except OSError as e:
+            print(f"Spectrum analyzer unavailable: {e}")
+            self._running = False
+            return
+        self._path = path
+        self._eof = False
+        self._position = offset
+        self._samples = np.zeros(WINDOW, dtype=np.float32)
+        self._previous = None
+        self._flux = deque(maxlen=43)  # ~1 s of spectral flux history
+        self._peak = 1e-6
+        self._last_onset = -1.0
+        self._frames = deque()
+
+    def _close(self):
+        if self._process:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+        self._path = None
+
+    def _run(self):
+        self._path = None
+        while self._running:
+            path = self.player.current_file
+            if path is None or (not self.player.is_playing() and not self.player.paused):
+                self._close()
+                self.latest = SILENCE
+                time.sleep(0.05)
+                continue
+
+            elapsed = self.player.get_elapsed()
+            behind = elapsed - self._position if self._path else 0.0
+            if path != self._path or behind < -(LOOKAHEAD + RESYNC) or (behind > RESYNC and not self._eof):
+                self._open(path, elapsed)
+                if not self._running:
+                    break
+            if self.player.paused:
+                time.sleep(0.02)
+                continue
+
+            while self._position < elapsed + LOOKAHEAD and self._decode_frame():
+                pass
+            # Publish the newest frame that playback has actually reached
+            frame = None
+            while self._frames and self._frames[0].position <= elapsed:
+                frame = self._frames.popleft()
+            if frame is not None:
+                self.latest = frame
+            time.sleep(0.005)
+        self._close()
+
+    def _decode_frame(self):
+        data = self._process.stdout.read(HOP * 2) if self._process else b""
+        if len(data) < 2:
+            self._eof = True
+            return False
+        hop = np.frombuffer(data[:len(data) // 2 * 2], dtype=np.int16).astype(np.float32) / 32768
+        self._samples = np.concatenate((self._samples[len(hop):], hop))
+        self._position += len(hop) / SAMPLE_RATE
+
+        spectrum = np.abs(np.fft.rfft(self._samples * self._window))
+        power = np.add.reduceat(spectrum ** 2, self._edges[:-1])[:NUM_BANDS]
+        # Slow automatic gain so quiet and loud masters both use the full 0..1 range
+        bands = np.log1p(power)
+        self._peak = max(self._peak * 0.999, float(bands.max()))
+        bands = np.clip(bands / self._peak, 0.0, 1.0)
+
+        onset = False
+        if self._previous is not None:
+            flux = float(np.maximum(spectrum - self._previous, 0).sum())
+            mean = sum(self._flux) / len(self._flux) if self._flux else flux
+            if flux > mean * 1.5 and flux > 1.0 and self._position - self._last_onset > 0.1:
+                onset = True
+                self._last_onset = self._position
+            self._flux.append(flux)
+        self._previous = spectrum
+
+        level = float(np.sqrt(np.mean(hop ** 2)))
+        self._frames.append(AnalysisFrame(self._position, level, bands, onset))
+        return True
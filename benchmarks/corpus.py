@@ -0,0 +1,57 @@
+import math
+import shutil
+import struct
+import subprocess
+import wave
+from pathlib import Path
+
+SAMPLE_RATE = 44100
+FFMPEG_FORMATS = {".flac": [], ".ogg": ["-c:a", "libvorbis"], ".opus": ["-c:a", "libopus"], ".mp3": ["-c:a", "libmp3lame"]}
+
+
+def write_wav(path, seconds, freq=440.0, sample_rate=SAMPLE_RATE):
+    frames = int(seconds * sample_rate)
+    tone = bytearray()
+    for i in range(sample_rate):
+        v = int(8000 * math.sin(2 * math.pi * freq * i / sample_rate))
+        tone += struct.pack("<hh", v, v)
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        for start in range(0, frames, sample_rate):
+            w.writeframes(bytes(tone[:(min(sample_rate, frames - start)) * 4]))
+
+
+def write_cbr_mp3(path, seconds):
+    # MPEG-1 Layer III, 128 kbps, 44.1 kHz, joint stereo, silent payload
+    frames = int(seconds * SAMPLE_RATE / 1152)
+    with open(path, "wb") as f:
+        for i in range(frames):
+            padding = 1 if i % 49 else 0
+            header = bytes([0xFF, 0xFB, 0x90 | (padding << 1), 0x64])
+            f.write(header + bytes(413 + padding))
+
+
+def generate(root: Path, count=20, seconds=30):
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    ffmpeg = shutil.which("ffmpeg")
+    files = []
+    for i in range(count):
+        wav = root / f"track_{i:04d}.wav"
+        if not wav.exists():
+            write_wav(wav, seconds, freq=220 + 20 * i)
+        files.append(wav)
+        mp3 = root / f"track_{i:04d}_cbr.mp3"
+        if not mp3.exists():
+            write_cbr_mp3(mp3, seconds)
+        files.append(mp3)
+        if ffmpeg:
+            for ext, args in FFMPEG_FORMATS.items():
+                out = root / f"track_{i:04d}{ext}"
+                if not out.exists():
+                    subprocess.run([ffmpeg, "-v", "error", "-y", "-i", str(wav), *args, str(out)], check=False)
+                if out.exists():
+                    files.append(out)
+    return files
@@ -0,0 +1,50 @@
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from benchmarks.corpus import generate
+from containers import read_info
+from metadata import probe_ffprobe
+
+
+def rate(fn, files, repeat):
+    start = time.perf_counter()
+    failures = 0
+    for _ in range(repeat):
+        for f in files:
+            try:
+                fn(f)
+            except Exception:
+                failures += 1
+    elapsed = time.perf_counter() - start
+    return {"probes_per_sec": round(len(files) * repeat / elapsed, 1), "failures": failures}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare native header parsing against ffprobe")
+    parser.add_argument("--corpus", type=Path, default=Path(tempfile.gettempdir()) / "slmp_bench_corpus")
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    by_ext = defaultdict(list)
+    for f in generate(args.corpus, args.count):
+        by_ext[f.suffix].append(f)
+
+    results = {}
+    for ext, files in sorted(by_ext.items()):
+        results[ext] = {"files": len(files), "native": rate(read_info, files, args.repeat)}
+        if shutil.which("ffprobe"):
+            results[ext]["ffprobe"] = rate(probe_ffprobe, files, 1)
+            results[ext]["speedup"] = round(
+                results[ext]["native"]["probes_per_sec"] / results[ext]["ffprobe"]["probes_per_sec"], 1
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
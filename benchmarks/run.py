@@ -0,0 +1,326 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.corpus import generate, write_wav
+
+
+def timings(samples):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+    }
+
+
+def build_tree(root: Path, folders, files_per_folder):
+    # Empty files are enough for listing benchmarks
+    root.mkdir(parents=True, exist_ok=True)
+    for d in range(folders):
+        folder = root / f"artist_{d:04d}"
+        folder.mkdir(exist_ok=True)
+        for f in range(files_per_folder):
+            (folder / f"song_{f:05d}.mp3").touch()
+    big = root / "big_folder"
+    big.mkdir(exist_ok=True)
+    for f in range(folders * files_per_folder // 4):
+        (big / f"track_{f:06d}.flac").touch()
+    return big
+
+
+# --- Scanning ---
+def bench_scan(work: Path, folders, files_per_folder):
+    from library import LibraryIndex
+    from listing import scan_listing
+
+    tree = work / "Music"
+    big = build_tree(tree, folders, files_per_folder)
+    result = {"entries": folders * files_per_folder, "big_folder_entries": len(os.listdir(big))}
+
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        scan_listing(big)
+        samples.append(time.perf_counter() - start)
+    result["scan_listing_big_folder"] = timings(samples)
+
+    index = LibraryIndex(tree, work / "bench_library.db")
+    start = time.perf_counter()
+    index.scan()
+    result["library_full_scan_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    start = time.perf_counter()
+    index.scan()
+    result["library_incremental_scan_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        index.list_dir(big)
+        samples.append(time.perf_counter() - start)
+    result["library_list_dir_big_folder"] = timings(samples)
+    return result
+
+
+def bench_load_files(work: Path):
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return {"skipped": f"no display for Tk: {e}"}
+    root.withdraw()
+    from ui import SLMP
+
+    result = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = SLMP(root)
+        app.current_dir = work / "Music" / "big_folder"
+        samples, full = [], []
+        for _ in range(3):
+            start = time.perf_counter()
+            app.load_files()
+            samples.append(time.perf_counter() - start)
+            while app.populated < len(app.listing):
+                root.update()
+            full.append(time.perf_counter() - start)
+        result["load_files_first_paint"] = timings(samples)
+        result["load_files_fully_populated"] = timings(full)
+
+        for source in ("loop", "shuffle", "stop"):
+            samples = []
+            for _ in range(50):
+                start = time.perf_counter()
+                app.apply_state(source)
+                samples.append(time.perf_counter() - start)
+            result[f"apply_state_{source}"] = timings(samples)
+        samples = []
+        for _ in range(200):
+            start = time.perf_counter()
+            app.reconcile_state()
+            samples.append(time.perf_counter() - start)
+        result["reconcile_state"] = timings(samples)
+    root.destroy()
+    return result
+
+
+# --- Startup ---
+IMPORT_PROBE = (
+    "import sys, time; start = time.perf_counter(); import ui; "
+    "print(time.perf_counter() - start, ' '.join(m for m in ('numpy', 'pygame') if m in sys.modules))"
+)
+
+
+def bench_startup(runs=5):
+    # Fresh interpreters, so nothing is already imported
+    samples, loaded = [], ""
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent.parent,
+        ).stdout.split(maxsplit=1)
+        samples.append(float(output[0]))
+        loaded = output[1].strip() if len(output) > 1 else ""
+    return {"import_ui": timings(samples), "heavy_modules_at_import": loaded or "none"}
+
+
+def bench_daemon(work: Path, commands=500):
+    # Round trips over the control socket plus the resident size of the headless player
+    import socket
+    path = work / "slmp.sock"
+    process = subprocess.Popen(
+        [sys.executable, "main.py", "--daemon", "--socket", str(path)],
+        cwd=Path(__file__).resolve().parent.parent, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + 10.0
+        while not path.exists():
+            if process.poll() is not None or time.time() > deadline:
+                return {"skipped": "daemon did not start"}
+            time.sleep(0.05)
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.connect(str(path))
+            stream = sock.makefile("rwb")
+            samples = []
+            for _ in range(commands):
+                start = time.perf_counter()
+                stream.write(b"status\n")
+                stream.flush()
+                stream.readline()
+                samples.append(time.perf_counter() - start)
+            result = {"status_roundtrip": timings(samples)}
+            try:
+                status = Path(f"/proc/{process.pid}/status").read_text()
+                result["rss_kb"] = int(next(l for l in status.splitlines() if l.startswith("VmRSS")).split()[1])
+            except (OSError, StopIteration):
+                pass
+            stream.write(b"quit\n")
+            stream.flush()
+        process.wait(timeout=5)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return result
+
+
+# --- Probing ---
+def bench_probe(work: Path, count):
+    from metadata import MetadataCache
+    from player import Player
+
+    files = generate(work / "corpus", count, seconds=5)
+    player = Player(on_finish_callback=lambda: None, metadata=MetadataCache(work / "bench_metadata.db"))
+    result = {"files": len(files)}
+    for label in ("cold", "warm"):
+        start = time.perf_counter()
+        for f in files:
+            player.get_duration(f)
+        elapsed = time.perf_counter() - start
+        result[f"get_duration_{label}_per_sec"] = round(len(files) / elapsed, 1)
+    result["cache"] = player.metadata.stats()
+    return result
+
+
+# --- Playback ---
+def wait_for(condition, timeout=5.0, interval=0.001):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return False
+
+
+def bench_playback(work: Path):
+    import pygame
+    from engine import AudioEngine
+    from player import Player
+
+    tracks = []
+    for i in range(3):
+        path = work / f"gap_{i}.wav"
+        write_wav(path, 1.0, 300 + 100 * i)
+        tracks.append(path)
+
+    result = {}
+    player = Player(on_finish_callback=lambda: None)
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        player.play(tracks[0])
+        # Audible once the mixer has consumed audio for the new track
+        wait_for(lambda: pygame.mixer.music.get_pos() > 0)
+        samples.append(time.perf_counter() - start)
+    result["play_to_audible"] = timings(samples)
+
+    for gapless in (False, True):
+        pending = list(tracks[1:])
+        calls = []
+
+        def on_finish():
+            calls.append(time.perf_counter())
+            if pending and gapless:
+                player.queue(pending.pop(0))
+            elif pending:
+                player.play(pending.pop(0))
+
+        player.stop()
+        player.on_finish_callback = on_finish
+        player.gap_history.clear()
+        player.play(tracks[0])
+        if gapless:
+            player.queue(pending.pop(0))
+        wait_for(lambda: player.poll() or len(calls) >= len(tracks), timeout=10.0)
+        result["gapless_gap" if gapless else "sequential_gap"] = player.gap_stats()
+    player.stop()
+
+    engine = AudioEngine(on_finish_callback=lambda: None)
+    wait_for(lambda: engine.player is not None)
+    samples, confirmed = [], []
+    for _ in range(5):
+        start = time.perf_counter()
+        engine.play(tracks[0])
+        samples.append(time.perf_counter() - start)
+        wait_for(lambda: engine.player.is_playing())
+        confirmed.append(time.perf_counter() - start)
+        engine.stop()
+        wait_for(lambda: not engine.player.is_playing())
+    result["engine_play_call"] = timings(samples)
+    result["engine_play_to_mixer"] = timings(confirmed)
+    return result
+
+
+# --- Visuals ---
+def bench_visuals(ball_counts, frames):
+    import pygame
+    import visuals
+
+    pygame.display.init()
+    width, height = 1920, 1080
+    screen = pygame.display.set_mode((width, height))
+    result = {}
+    for count in ball_counts:
+        balls, particles = visuals.Balls(), visuals.Particles()
+        visuals.spawn_ball(balls, width, height, immune=False, count=count)
+        balls.radius[:balls.n] = visuals.rng.integers(4, 61, balls.n)
+        now = time.time()
+        # Keep the population fixed so every frame measures the same load
+        balls.immune_until[:balls.n] = now + 3600
+        sim, draw = [], []
+        for _ in range(frames):
+            start = time.perf_counter()
+            alive = visuals.step(balls, particles, width, height, now)
+            middle = time.perf_counter()
+            screen.fill((10, 10, 30))
+            visuals.draw(screen, balls, particles, alive)
+            sim.append(middle - start)
+            draw.append(time.perf_counter() - middle)
+        result[str(count)] = {"step": timings(sim), "draw": timings(draw), "balls": int(balls.n)}
+    pygame.display.quit()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless SLMP benchmark suite")
+    parser.add_argument("--output", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--folders", type=int, default=200)
+    parser.add_argument("--files-per-folder", type=int, default=100)
+    parser.add_argument("--probe-files", type=int, default=20)
+    parser.add_argument("--balls", type=int, nargs="+", default=[10, 100, 1000, 4000])
+    parser.add_argument("--frames", type=int, default=120)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    work = Path(tempfile.mkdtemp(prefix="slmp_bench_"))
+    # Keep caches and the scanned ~/Music inside the scratch directory
+    os.environ["HOME"] = str(work)
+    os.environ["XDG_CACHE_HOME"] = str(work / "cache")
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "startup": bench_startup(),
+        "scan": bench_scan(work, args.folders, args.files_per_folder),
+        "probe": bench_probe(work, args.probe_files),
+        "playback": bench_playback(work),
+        "visuals": bench_visuals(args.balls, args.frames),
+        "ui": bench_load_files(work),
+        "daemon": bench_daemon(work),
+    }
+    args.output.write_text(json.dumps(results, indent=2))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import os
+import struct
+from pathlib import Path
+
+HEAD_BYTES = 64 * 1024
+TAIL_BYTES = 64 * 1024
+
+# MPEG audio header tables, indexed [version][layer]
+MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+
+def _info(duration, codec, sample_rate, channels, bit_rate):
+    return {
+        "duration": float(duration),
+        "codec": codec,
+        "sample_rate": int(sample_rate),
+        "channels": int(channels),
+        "bit_rate": int(bit_rate),
+    }
+
+
+def _read_tail(f, size):
+    f.seek(max(0, size - TAIL_BYTES))
+    return f.read()
+
+
+def skip_id3v2(head):
+    if head[:3] != b"ID3" or len(head) < 10:
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+# --- WAV ---
+def read_wav(f, size):
+    head = f.read(12)
+    if head[:4] not in (b"RIFF", b"RIFX") or head[8:12] != b"WAVE":
+        raise ValueError("not a RIFF/WAVE file")
+    endian = "<" if head[:4] == b"RIFF" else ">"
+    fmt = None
+    pos = 12
+    while pos + 8 <= size:
+        f.seek(pos)
+        chunk_id, chunk_size = struct.unpack(endian + "4sI", f.read(8))
+        if chunk_id == b"fmt ":
+            fmt = struct.unpack(endian + "HHIIHH", f.read(16))
+        elif chunk_id == b"data":
+            if fmt is None:
+                break
+            tag, channels, sample_rate, byte_rate, _, bits = fmt
+            data_size = min(chunk_size, size - pos - 8)
+            if not byte_rate:
+                raise ValueError("zero byte rate")
+            codec = "pcm_s%d" % bits if tag in (1, 0xFFFE) else "wav_%04x" % tag
+            return _info(data_size / byte_rate, codec, sample_rate, channels, byte_rate * 8)
+        pos += 8 + chunk_size + (chunk_size & 1)
+    raise ValueError("no fmt/data chunk")
+
+
+# --- FLAC ---
+def read_flac(f, size):
+    head = f.read(HEAD_BYTES)
+    start = skip_id3v2(head)
+    f.seek(start)
+    if f.read(4) != b"fLaC":
+        raise ValueError("not a FLAC file")
+    block = f.read(4)
+    if block[0] & 0x7F != 0:
+        raise ValueError("STREAMINFO is not the first metadata block")
+    info = f.read(34)
+    bits = int.from_bytes(info[10:18], "big")
+    sample_rate = bits >> 44
+    channels = ((bits >> 41) & 0x7) + 1
+    total_samples = bits & 0xFFFFFFFFF
+    if not sample_rate or not total_samples:
+        raise ValueError("STREAMINFO has no length")
+    duration = total_samples / sample_rate
+    return _info(duration, "flac", sample_rate, channels, size * 8 / duration)
+
+
+# --- MP3 ---
+def parse_mp3_header(b):
+    if len(b) < 4 or b[0] != 0xFF or b[1] & 0xE0 != 0xE0:
+        return None
+    version = {0: 2.5, 2: 2, 3: 1}.get((b[1] >> 3) & 0x3)
+    layer = {1: 3, 2: 2, 3: 1}.get((b[1] >> 1) & 0x3)
+    bitrate_index = b[2] >> 4
+    rate_index = (b[2] >> 2) & 0x3
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = MP3_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    padding = (b[2] >> 1) & 0x1
+    channels = 1 if b[3] >> 6 == 3 else 2
+    if layer == 1:
+        samples = 384
+        frame_size = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if version == 1 or layer == 2 else 576
+        frame_size = samples // 8 * bitrate // sample_rate + padding
+    return {
+        "version": version, "layer": layer, "bitrate": bitrate, "sample_rate": sample_rate,
+        "channels": channels, "samples": samples, "frame_size": frame_size,
+    }
+
+
+def find_mp3_frame(buf, start=0):
+    # A sync is accepted only if the following frame header is valid too
+    pos = buf.find(b"\xff", start)
+    while 0 <= pos < len(buf) - 4:
+        header = parse_mp3_header(buf[pos:pos + 4])
+        if header:
+            following = buf[pos + header["frame_size"]:pos + header["frame_size"] + 4]
+            if len(following) < 4 or parse_mp3_header(following):
+                return pos, header
+        pos = buf.find(b"\xff", pos + 1)
+    raise ValueError("no MPEG audio frame found")
+
+
+def read_mp3(f, size):
+    head = f.read(HEAD_BYTES)
+    start = skip_id3v2(head)
+    if start > len(head) - 4:
+        f.seek(start)
+        head = f.read(HEAD_BYTES)
+        offset, start = start, 0
+    else:
+        offset = 0
+    pos, header = find_mp3_frame(head, start)
+    audio_start = offset + pos
+    sample_rate = header["sample_rate"]
+    frame = head[pos:pos + header["frame_size"]]
+
+    if header["version"] == 1:
+        side_info = 17 if header["channels"] == 1 else 32
+    else:
+        side_info = 9 if header["channels"] == 1 else 17
+    xing = frame[4 + side_info:4 + side_info + 12]
+    frames = None
+    codec = "mp3" if header["layer"] == 3 else "mp%d" % header["layer"]
+    if xing[:4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", xing[4:8])[0]
+        if flags & 0x1:
+            frames = struct.unpack(">I", xing[8:12])[0]
+    elif frame[36:40] == b"VBRI":
+        frames = struct.unpack(">I", frame[50:54])[0]
+
+    tail = _read_tail(f, size)
+    audio_end = size - 128 if tail[-128:-125] == b"TAG" else size
+    audio_bytes = audio_end - audio_start
+    if frames:
+        duration = frames * header["samples"] / sample_rate
+        bit_rate = audio_bytes * 8 / duration if duration else header["bitrate"]
+    else:
+        duration = audio_bytes * 8 / header["bitrate"]
+        bit_rate = header["bitrate"]
+    return _info(duration, codec, sample_rate, header["channels"], bit_rate)
+
+
+# --- Ogg (Vorbis / Opus) ---
+def parse_ogg_page(buf, pos):
+    if buf[pos:pos + 4] != b"OggS" or len(buf) < pos + 27:
+        return None
+    granule, serial = struct.unpack("<qI", buf[pos + 6:pos + 18])
+    segments = buf[pos + 26]
+    lacing = buf[pos + 27:pos + 27 + segments]
+    header_size = 27 + segments
+    return {"granule": granule, "serial": serial, "header_size": header_size, "body_size": sum(lacing)}
+
+
+def read_ogg(f, size):
+    head = f.read(HEAD_BYTES)
+    page = parse_ogg_page(head, 0)
+    if page is None:
+        raise ValueError("not an Ogg file")
+    packet = head[page["header_size"]:page["header_size"] + page["body_size"]]
+    if packet[:7] == b"\x01vorbis":
+        codec = "vorbis"
+        channels = packet[11]
+        sample_rate, _, nominal = struct.unpack("<Iii", packet[12:24])
+        clock, pre_skip = sample_rate, 0
+    elif packet[:8] == b"OpusHead":
+        codec = "opus"
+        channels = packet[9]
+        pre_skip = struct.unpack("<H", packet[10:12])[0]
+        sample_rate = struct.unpack("<I", packet[12:16])[0] or 48000
+        clock, nominal = 48000, 0
+    else:
+        raise ValueError("unsupported Ogg codec")
+
+    tail = _read_tail(f, size)
+    pos = tail.rfind(b"OggS")
+    while pos >= 0:
+        last = parse_ogg_page(tail, pos)
+        if last and last["serial"] == page["serial"] and last["granule"] > 0:
+            duration = (last["granule"] - pre_skip) / clock
+            bit_rate = size * 8 / duration if duration > 0 else nominal
+            return _info(duration, codec, sample_rate, channels, bit_rate)
+        pos = tail.rfind(b"OggS", 0, pos)
+    raise ValueError("no final granule position")
+
+
+READERS = {
+    ".wav": read_wav,
+    ".flac": read_flac,
+    ".mp3": read_mp3,
+    ".ogg": read_ogg,
+    ".opus": read_ogg,
+}
+
+
+def read_info(filepath: Path) -> dict:
+    reader = READERS.get(Path(filepath).suffix.lower())
+    if reader is None:
+        raise ValueError(f"no native reader for {filepath}")
+    with open(filepath, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        try:
+            info = reader(f, size)
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"truncated header: {e}")
+    if info["duration"] <= 0:
+        raise ValueError("non-positive duration")
+    return info
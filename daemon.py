@@ -0,0 +1,287 @@
+import asyncio
+import json
+import os
+import shlex
+import socket
+import time
+from collections import deque
+from pathlib import Path
+import metrics
+from metadata import CACHE_DIR
+from library import LibraryIndex
+from listing import scan_listing
+from playqueue import PlayQueue
+
+POLL_INTERVAL = 0.02
+
+
+def default_socket():
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    return (Path(runtime) if runtime else CACHE_DIR) / "slmp.sock"
+
+
+class Daemon:
+    # Headless player: Player, the shuffle bag and an up-next queue driven from one asyncio loop.
+    # Clients send one command per line, either JSON ({"cmd": "seek", "args": [30]}) or plain
+    # words ("seek 30"), and get one JSON object back per line.
+    def __init__(self, root: Path, socket_path=None):
+        from player import Player
+        self.player = Player(on_finish_callback=self._on_finish)
+        self.library = LibraryIndex(root)
+        self.socket_path = Path(socket_path) if socket_path else default_socket()
+        self.play_queue = PlayQueue()
+        self.queue = deque()  # enqueued tracks, played before the folder or shuffle order
+        self.context = []  # the folder the current track was started from
+        self.current = None
+        self.loop = False
+        self.shuffle = None  # None, "folder" or "library"
+        self._finished = False
+        self._stopping = None
+
+    # --- Serving ---
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self):
+        self._stopping = asyncio.Event()
+        self._claim_socket()
+        # The socket accepts play and load of any path, so it is owner-only from the moment it exists
+        umask = os.umask(0o077)
+        try:
+            server = await asyncio.start_unix_server(self._client, path=str(self.socket_path))
+        finally:
+            os.umask(umask)
+        asyncio.get_running_loop().run_in_executor(None, self._scan_library)
+        poller = asyncio.create_task(self._poll())
+        print(f"SLMP daemon listening on {self.socket_path}")
+        try:
+            async with server:
+                await self._stopping.wait()
+        finally:
+            poller.cancel()
+            self.player.stop()
+            try:
+                self.socket_path.unlink()
+            except OSError:
+                pass
+
+    def _scan_library(self):
+        from watcher import FolderWatcher
+        self.library.scan()
+        self.library.watch(FolderWatcher())
+
+    def _claim_socket(self):
+        # A socket file nobody answers on is left over from a crash
+        if not self.socket_path.exists():
+            self.socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            return
+        probe = socket.socket(socket.AF_UNIX)
+        try:
+            probe.connect(str(self.socket_path))
+        except OSError:
+            self.socket_path.unlink()
+            return
+        finally:
+            probe.close()
+        raise SystemExit(f"Another SLMP daemon is listening on {self.socket_path}")
+
+    async def _client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    writer.write(json.dumps(self.handle(line)).encode() + b"\n")
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass  # cancelled when the server shuts down with clients still connected
+        finally:
+            writer.close()
+
+    async def _poll(self):
+        while True:
+            self.player.poll()
+            if self._finished:
+                self._finished = False
+                self._track_finished()
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def handle(self, line):
+        started = time.perf_counter()
+        try:
+            text = line.decode().strip()
+            if text.startswith("{"):
+                request = json.loads(text)
+                name, args = request.get("cmd", ""), request.get("args", [])
+            else:
+                name, *args = shlex.split(text)
+            command = getattr(self, f"cmd_{name}", None)
+            if command is None:
+                return {"ok": False, "error": f"unknown command: {name}"}
+            reply = command(*args) or self.cmd_status()
+            reply["ok"] = True
+            metrics.count(f"daemon.{name}")
+        except Exception as e:
+            reply = {"ok": False, "error": str(e)}
+        metrics.observe("daemon.command", time.perf_counter() - started)
+        return reply
+
+    # --- Commands ---
+    def cmd_status(self):
+        player = self.player
+        if player.start_time is None:
+            state = "stopped"
+        else:
+            state = "paused" if player.paused else "playing"
+        return {
+            "state": state,
+            "track": str(player.current_file) if player.current_file else None,
+            "elapsed": round(player.get_elapsed(), 3) if state != "stopped" else 0.0,
+            "duration": player.duration,
+            "loop": self.loop,
+            "shuffle": self.shuffle,
+            "queue": [str(p) for p in self.queue],
+        }
+
+    def cmd_play(self, path=None):
+        if path is None:
+            if self.player.paused:
+                self.player.toggle_pause()
+            elif self.player.start_time is None and self.context:
+                self._play(self.current or self.context[0])
+            return
+        path = Path(path).expanduser().resolve()
+        if path.is_dir():
+            self.context = [path / name for name in self._audio_names(path)]
+            if not self.context:
+                raise ValueError(f"no audio files in {path}")
+            track = self.context[0]
+        elif path.is_file():
+            self.context = [path.parent / name for name in self._audio_names(path.parent)]
+            track = path
+        else:
+            raise ValueError(f"not found: {path}")
+        if self.shuffle:
+            self._load_shuffle(track)
+        self._play(track)
+
+    def cmd_pause(self):
+        if self.player.start_time is not None and not self.player.paused:
+            self.player.toggle_pause()
+
+    def cmd_stop(self):
+        self.player.stop()
+
+    def cmd_seek(self, seconds):
+        if self.player.start_time is None:
+            raise ValueError("nothing is playing")
+        self.player.seek(max(0.0, float(seconds)))
+
+    def cmd_next(self):
+        track = self._take_next(repeat=False)
+        if track is None:
+            self.player.stop()
+        else:
+            self._play(track)
+
+    def cmd_enqueue(self, *paths):
+        for path in paths:
+            path = Path(path).expanduser().resolve()
+            if not path.is_file():
+                raise ValueError(f"not a file: {path}")
+            self.queue.append(path)
+        self._queue_upcoming()
+
+    def cmd_shuffle(self, scope="folder"):
+        # "folder", "library" or "off"
+        if scope not in ("folder", "library", "off"):
+            raise ValueError(f"unknown shuffle scope: {scope}")
+        self.shuffle = None if scope == "off" else scope
+        if self.shuffle:
+            self.loop = False
+            self._load_shuffle(self.current)
+        self._queue_upcoming()
+
+    def cmd_loop(self, enabled="on"):
+        self.loop = enabled == "on"
+        if self.current and self.player.start_time is not None:
+            # The mixer only loops a file it was started with
+            elapsed = self.player.get_elapsed()
+            self.player.play(self.current, loop=self.loop)
+            self.player.seek(elapsed)
+        self._queue_upcoming()
+
+    def cmd_volume(self, volume):
+        self.player.set_volume(max(0.0, min(1.0, float(volume) / 100)))
+
+    def cmd_quit(self):
+        self._stopping.set()
+        return {"state": "quitting"}
+
+    # --- Queue logic ---
+    def _audio_names(self, directory):
+        listing = scan_listing(directory)
+        return [listing.names[i] for i in listing.audio_indices()]
+
+    def _load_shuffle(self, current):
+        if self.shuffle == "library" and not self.library.scanning and self.library.count():
+            self.play_queue.load(self.library.tracks(), current=current)
+        else:
+            self.play_queue.load(self.context, current.parent if current else None, current)
+
+    def _peek_next(self, repeat=True):
+        if repeat and self.loop and self.current:
+            return self.current
+        if self.queue:
+            return self.queue[0]
+        if self.shuffle:
+            return self.play_queue.peek()
+        if self.current in self.context:
+            return self.context[(self.context.index(self.current) + 1) % len(self.context)]
+        return self.context[0] if self.context else None
+
+    def _take_next(self, repeat=True):
+        track = self._peek_next(repeat)
+        if track is None or (repeat and self.loop):
+            return track
+        if self.queue and track == self.queue[0]:
+            self.queue.popleft()
+        elif self.shuffle:
+            self.play_queue.next()
+        return track
+
+    def _play(self, track):
+        self.current = track
+        self.player.play(track, loop=self.loop)
+        self.play_queue.played(track)
+        self._queue_upcoming()
+
+    def _queue_upcoming(self):
+        # Hand the mixer the next file so the switch is gapless; a later enqueue replaces it
+        if self.loop or self.player.start_time is None:
+            return
+        track = self._peek_next()
+        if track is not None:
+            self.player.queue(track)
+
+    def _on_finish(self):
+        # Called from inside Player.poll(), handled once poll has returned
+        self._finished = True
+
+    def _track_finished(self):
+        switched = self.player.current_file if self.player.is_playing() else None
+        track = self._take_next()
+        if track is None:
+            self.current = None
+            return
+        if switched == track.resolve():
+            # The mixer already moved on to the queued file
+            self.current = track
+            self.play_queue.played(track)
+            self._queue_upcoming()
+        else:
+            self._play(track)
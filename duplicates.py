@@ -0,0 +1,199 @@
+import hashlib
+import mmap
+import multiprocessing as mp
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import metrics
+from metadata import CACHE_DIR
+
+PARTIAL_BYTES = 64 * 1024  # hashed from each end of a file before committing to a full read
+PARTIAL_BATCH = 64  # files per worker task for the partial pass, they are cheap
+
+
+# --- Worker processes ---
+def _init_worker():
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+
+def _digest():
+    return hashlib.blake2b(digest_size=16)
+
+
+def partial_hash(path, size):
+    # Head and tail of the file; small files are read whole, so their partial hash is also the full one.
+    # Returns (partial, full or None), or None if the file cannot be read.
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            if size <= 2 * PARTIAL_BYTES:
+                digest = _digest()
+                digest.update(m)
+                full = digest.hexdigest()
+                return full, full
+            digest = _digest()
+            digest.update(m[:PARTIAL_BYTES])
+            digest.update(m[-PARTIAL_BYTES:])
+            return digest.hexdigest(), None
+    except (OSError, ValueError):
+        return None
+
+
+def partial_hashes(batch):
+    return [partial_hash(path, size) for path, size in batch]
+
+
+def full_hash(path):
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            if hasattr(m, "madvise"):
+                m.madvise(mmap.MADV_SEQUENTIAL)
+            digest = _digest()
+            digest.update(m)
+            return digest.hexdigest()
+    except (OSError, ValueError):
+        return None
+
+
+def _size(size):
+    return f"{size / 1e6:.1f} MB" if size >= 100_000 else f"{size / 1e3:.0f} KB"
+
+
+def report(groups):
+    if not groups:
+        return "No duplicate tracks found."
+    wasted = sum(size * (len(paths) - 1) for size, paths in groups)
+    lines = [f"{len(groups)} duplicate groups, {_size(wasted)} in extra copies"]
+    for size, paths in groups:
+        lines.append("")
+        lines.append(f"{len(paths)} copies, {_size(size)} each:")
+        lines.extend(f"  {path}" for path in paths)
+    return "\n".join(lines)
+
+
+class DuplicateFinder:
+    # Narrows the library down to identical files in three passes: same size, then the same hash of
+    # head and tail, then the same full hash. Only the last pass reads whole files, and only for the
+    # few files that got that far. Hashes are kept per path with the size and mtime they were taken at,
+    # so a rerun only hashes what changed.
+    def __init__(self, db_path=None, workers=None):
+        self.db_path = Path(db_path) if db_path else CACHE_DIR / "duplicates.db"
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.groups = None  # (size, [paths]) with the most wasted space first, None until a search finished
+        self.searching = False
+        self._group_of = {}
+        self._lock = threading.Lock()
+        try:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Duplicate cache unavailable, using memory: {e}")
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, partial TEXT, full TEXT)"
+        )
+        self._db.commit()
+
+    def find(self, files):
+        # files: (path, size, mtime) for every track. Returns the duplicate groups.
+        self.searching = True
+        try:
+            with metrics.timed("duplicates.find"):
+                groups = self._find(files)
+        finally:
+            self.searching = False
+        with self._lock:
+            self.groups = groups
+            self._group_of = {path: i for i, (_, paths) in enumerate(groups) for path in paths}
+        metrics.count("duplicates.groups", len(groups))
+        return groups
+
+    def _find(self, files):
+        by_size = defaultdict(list)
+        for path, size, mtime in files:
+            if size:
+                by_size[size].append((path, mtime))
+        candidates = {path: (size, mtime) for size, group in by_size.items() if len(group) > 1 for path, mtime in group}
+
+        cached = {}
+        stale = []
+        with self._lock:
+            rows = self._db.execute("SELECT path, size, mtime, partial, full FROM hashes").fetchall()
+        for path, size, mtime, partial, full in rows:
+            if candidates.get(path) == (size, mtime):
+                cached[path] = [partial, full]
+            else:
+                stale.append((path,))
+        metrics.count("duplicates.cached", len(cached))
+
+        executor = None
+        try:
+            # Pass 2: head and tail
+            pending = [(path, candidates[path][0]) for path in candidates if path not in cached]
+            if pending:
+                executor = self._executor()
+                batches = [pending[i:i + PARTIAL_BATCH] for i in range(0, len(pending), PARTIAL_BATCH)]
+                for batch, results in zip(batches, executor.map(partial_hashes, batches)):
+                    for (path, _), result in zip(batch, results):
+                        if result is not None:
+                            cached[path] = list(result)
+                metrics.count("duplicates.partial", len(pending))
+
+            by_partial = defaultdict(list)
+            for path, (partial, _) in cached.items():
+                by_partial[(candidates[path][0], partial)].append(path)
+
+            # Pass 3: whole files, only where size and both ends agree
+            pending = [path for group in by_partial.values() if len(group) > 1 for path in group if cached[path][1] is None]
+            if pending:
+                executor = executor or self._executor()
+                for path, full in zip(pending, executor.map(full_hash, pending)):
+                    cached[path][1] = full
+                metrics.count("duplicates.full", len(pending))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        with self._lock:
+            self._db.executemany("DELETE FROM hashes WHERE path = ?", stale)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime, partial, full) VALUES (?, ?, ?, ?, ?)",
+                [(path, *candidates[path], partial, full) for path, (partial, full) in cached.items()],
+            )
+            self._db.commit()
+
+        by_full = defaultdict(list)
+        for path, (_, full) in cached.items():
+            if full is not None:
+                by_full[(candidates[path][0], full)].append(path)
+        groups = [(size, sorted(paths)) for (size, _), paths in by_full.items() if len(paths) > 1]
+        groups.sort(key=lambda group: (-group[0] * (len(group[1]) - 1), group[1][0]))
+        return groups
+
+    def _executor(self):
+        return ProcessPoolExecutor(self.workers, mp_context=mp.get_context("spawn"), initializer=_init_worker)
+
+    def unique(self, paths, keep=None):
+        # paths with every extra copy of a track left out; the first copy listed stays, or `keep` if it is one
+        with self._lock:
+            group_of = self._group_of
+        if not group_of:
+            return list(paths)
+        seen = set()
+        if keep is not None and str(keep) in group_of:
+            seen.add(group_of[str(keep)])
+        result = []
+        for path in paths:
+            group = group_of.get(str(path))
+            if group is None or path == keep:
+                result.append(path)
+            elif group not in seen:
+                seen.add(group)
+                result.append(path)
+        return result
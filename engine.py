@@ -0,0 +1,176 @@
+import queue
+import threading
+import time
+from pathlib import Path
+import metrics
+from metadata import MetadataCache
+from seektable import SeekTableCache
+
+SNAPSHOT_INTERVAL = 0.25  # resync the UI clock at least this often
+
+
+class AudioEngine:
+    # Owns the Player on one long-lived thread. The Tk side only enqueues commands
+    # and reads the latest published snapshot, so no UI call ever waits on the mixer.
+    # Commands sent before start() wait in the queue until the mixer is up.
+    def __init__(self, on_finish_callback, autostart=True):
+        self.on_finish_callback = on_finish_callback
+        self.metadata = MetadataCache()
+        self.seek_tables = SeekTableCache()
+        self.loudness = None  # created by start(), loudness.py pulls in numpy
+        self.commands = queue.Queue()
+        self.snapshots = queue.Queue()
+        self.player = None
+
+        # Mirror of the engine state as seen by the UI
+        self.current_file = None
+        self.looping = False
+        self.paused = False
+        self.playing = False
+        self.duration = 0.0
+        self.last_gap_ms = None
+        self._elapsed = 0.0
+        self._elapsed_at = None
+        self._issued = 0
+        self._finished_seen = 0
+
+        self._thread = None
+        if autostart:
+            self.start()
+
+    def start(self):
+        if self._thread is None:
+            from loudness import LoudnessStore
+            self.loudness = LoudnessStore()
+            self._thread = threading.Thread(target=self._run, name="audio-engine", daemon=True)
+            self._thread.start()
+
+    # --- UI side ---
+    def _send(self, name, *args):
+        self._issued += 1
+        self.commands.put((self._issued, name, args))
+
+    def play(self, filepath: Path, loop: bool = False):
+        self.current_file = filepath.resolve()
+        self.looping = loop
+        self.playing = True
+        self.paused = False
+        self.duration = 0.0
+        self._set_elapsed(0.0, running=True)
+        self._send("play", filepath, loop)
+
+    def queue(self, filepath: Path):
+        self._send("queue", filepath)
+
+    def toggle_pause(self):
+        elapsed = self.get_elapsed()
+        self.paused = not self.paused
+        self._set_elapsed(elapsed, running=not self.paused)
+        self._send("toggle_pause")
+
+    def stop(self):
+        self.playing = False
+        self.paused = False
+        self.duration = 0.0
+        self._set_elapsed(0.0, running=False)
+        self._send("stop")
+
+    def seek(self, seconds: float):
+        self._set_elapsed(seconds, running=self.playing and not self.paused)
+        self._send("seek", seconds)
+
+    def set_volume(self, volume: float):
+        self._send("set_volume", volume)
+
+    def is_playing(self):
+        return self.playing and not self.paused
+
+    def get_elapsed(self) -> float:
+        elapsed = self._elapsed
+        if self._elapsed_at is not None:
+            elapsed += time.time() - self._elapsed_at
+        if self.looping and self.duration > 0:
+            return elapsed % self.duration
+        return min(elapsed, self.duration) if self.duration > 0 else elapsed
+
+    def _set_elapsed(self, elapsed, running):
+        self._elapsed = elapsed
+        self._elapsed_at = time.time() if running else None
+
+    def poll(self):
+        # Drain snapshots on the Tk thread; stale ones (older than our last command) only carry finish events
+        latest = None
+        while True:
+            try:
+                latest = self.snapshots.get_nowait()
+            except queue.Empty:
+                break
+            if latest["seq"] >= self._issued:
+                self._apply(latest)
+        if latest and latest["finished"] > self._finished_seen:
+            self._finished_seen = latest["finished"]
+            self.on_finish_callback()
+
+    def _apply(self, snapshot):
+        self.current_file = snapshot["current_file"]
+        self.looping = snapshot["looping"]
+        self.paused = snapshot["paused"]
+        self.playing = snapshot["playing"]
+        self.duration = snapshot["duration"]
+        self.last_gap_ms = snapshot["last_gap_ms"]
+        self._elapsed = snapshot["elapsed"]
+        self._elapsed_at = snapshot["taken_at"] if snapshot["playing"] and not snapshot["paused"] else None
+
+    # --- Engine thread ---
+    def _run(self):
+        from player import Player
+        self.player = Player(on_finish_callback=self._on_finish, metadata=self.metadata, seek_tables=self.seek_tables,
+                             loudness=self.loudness)
+        metrics.mark("mixer")
+        self._finished = 0
+        self._processed = 0
+        last_key = None
+        last_sent = 0.0
+        while True:
+            try:
+                command = self.commands.get(timeout=0.01)
+            except queue.Empty:
+                command = None
+            while command is not None:
+                seq, name, args = command
+                try:
+                    getattr(self.player, name)(*args)
+                except Exception as e:
+                    print(f"Engine command {name} failed: {e}")
+                self._processed = seq
+                try:
+                    command = self.commands.get_nowait()
+                except queue.Empty:
+                    command = None
+
+            self.player.poll()
+            snapshot = self._snapshot()
+            key = (snapshot["seq"], snapshot["finished"], snapshot["current_file"], snapshot["paused"],
+                   snapshot["playing"], snapshot["duration"], snapshot["looping"])
+            if key != last_key or snapshot["taken_at"] - last_sent > SNAPSHOT_INTERVAL:
+                self.snapshots.put(snapshot)
+                last_key = key
+                last_sent = snapshot["taken_at"]
+
+    def _on_finish(self):
+        self._finished += 1
+
+    def _snapshot(self):
+        player = self.player
+        return {
+            "seq": self._processed,
+            "finished": self._finished,
+            "current_file": player.current_file,
+            "looping": player.looping,
+            "paused": player.paused,
+            "playing": player.start_time is not None and (player.paused or player.is_playing()),
+            "duration": player.duration,
+            "elapsed": player.get_elapsed(),
+            "last_gap_ms": player.last_gap_ms,
+            "taken_at": time.time(),
+        }
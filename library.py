@@ -0,0 +1,250 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+import metrics
+from metadata import CACHE_DIR, probe
+from listing import Listing, is_audio_name
+
+ANNOTATE_BATCH = 500  # durations written per commit
+
+
+class LibraryIndex:
+    def __init__(self, root: Path, db_path=None):
+        self.root = Path(root)
+        self.db_path = Path(db_path) if db_path else CACHE_DIR / "library.db"
+        self.scanning = False
+        self.watcher = None
+        self.listeners = []  # called as listener(added, removed) with track paths after each change
+        self._lock = threading.Lock()
+        try:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Library index unavailable, using memory: {e}")
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime INTEGER)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "path TEXT PRIMARY KEY, dir TEXT, name TEXT, is_dir INTEGER, size INTEGER, mtime INTEGER, duration REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_dir ON entries(dir)")
+        self._db.commit()
+
+    # --- Scanning ---
+    def scan(self):
+        self.scanning = True
+        try:
+            with metrics.timed("library.scan"):
+                self._scan()
+        except Exception as e:
+            print(f"Library scan failed: {e}")
+        finally:
+            self.scanning = False
+
+    def _scan(self):
+        with self._lock:
+            known = dict(self._db.execute("SELECT path, mtime FROM dirs"))
+        seen = self._walk([str(self.root)], known)
+        self._drop_dirs([d for d in known if d not in seen])
+
+    def _walk(self, stack, known):
+        # Rescans every folder whose mtime differs from `known`, returns all folders reached
+        seen = set()
+        inodes = set()
+        while stack:
+            directory = stack.pop()
+            try:
+                st = os.stat(directory)
+            except OSError:
+                continue
+            # Symlinked folders can loop back on themselves
+            if (st.st_dev, st.st_ino) in inodes:
+                continue
+            inodes.add((st.st_dev, st.st_ino))
+            seen.add(directory)
+            if known.get(directory) == st.st_mtime_ns:
+                with self._lock:
+                    stack.extend(p for (p,) in self._db.execute(
+                        "SELECT path FROM entries WHERE dir = ? AND is_dir = 1", (directory,)
+                    ))
+                continue
+            stack.extend(self._rescan_dir(directory, st.st_mtime_ns))
+        return seen
+
+    def _drop_dirs(self, removed):
+        gone = []
+        with self._lock:
+            for directory in removed:
+                gone.extend(p for (p,) in self._db.execute(
+                    "SELECT path FROM entries WHERE dir = ? AND is_dir = 0", (directory,)
+                ))
+                self._db.execute("DELETE FROM dirs WHERE path = ?", (directory,))
+                self._db.execute("DELETE FROM entries WHERE dir = ?", (directory,))
+            self._db.commit()
+        if self.watcher is not None:
+            for directory in removed:
+                self.watcher.unwatch(directory, self._on_change)
+        self._notify([], gone)
+
+    # --- Watching ---
+    def watch(self, watcher):
+        # Once the startup scan is done, folder events keep the index current without rescans
+        self.watcher = watcher
+        with self._lock:
+            dirs = [p for (p,) in self._db.execute("SELECT path FROM dirs")]
+        for directory in dirs:
+            if not watcher.watch(directory, self._on_change):
+                break
+
+    def _on_change(self, directory, names, renames):
+        # Watcher thread: re-read the one folder and follow subfolders that came or went
+        directory = str(directory)
+        with self._lock:
+            before = {p for (p,) in self._db.execute(
+                "SELECT path FROM entries WHERE dir = ? AND is_dir = 1", (directory,)
+            )}
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return  # gone, the parent folder's event drops it
+        metrics.count("library.live_update")
+        after = set(self._rescan_dir(directory, mtime))
+        if before - after:
+            self._drop_dirs(self._subtree(before - after))
+        for path in self._walk(sorted(after - before), {}):
+            self.watcher.watch(path, self._on_change)
+
+    def _subtree(self, dirs):
+        found = []
+        with self._lock:
+            for directory in dirs:
+                found.extend(p for (p,) in self._db.execute(
+                    "SELECT path FROM dirs WHERE path = ? OR (path >= ? AND path < ?)",
+                    (directory, directory + os.sep, directory + chr(ord(os.sep) + 1)),
+                ))
+        return found
+
+    def _notify(self, added, removed):
+        if not added and not removed:
+            return
+        for listener in self.listeners:
+            try:
+                listener(added, removed)
+            except Exception as e:
+                print(f"Library listener failed: {e}")
+
+    def _rescan_dir(self, directory, mtime):
+        rows = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            rows.append((entry.path, directory, entry.name, 1, 0, 0))
+                            subdirs.append(entry.path)
+                        elif is_audio_name(entry.name):
+                            st = entry.stat()
+                            rows.append((entry.path, directory, entry.name, 0, st.st_size, st.st_mtime_ns))
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Cannot scan {directory}: {e}")
+            return []
+
+        with self._lock:
+            # Keep durations for files that did not change
+            old = {path: (size, mt, duration) for path, size, mt, duration in self._db.execute(
+                "SELECT path, size, mtime, duration FROM entries WHERE dir = ?", (directory,)
+            )}
+            self._db.execute("DELETE FROM entries WHERE dir = ?", (directory,))
+            self._db.executemany(
+                "INSERT OR REPLACE INTO entries (path, dir, name, is_dir, size, mtime, duration) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [row + (self._kept_duration(old.get(row[0]), row),) for row in rows],
+            )
+            self._db.execute("INSERT OR REPLACE INTO dirs (path, mtime) VALUES (?, ?)", (directory, mtime))
+            self._db.commit()
+        tracks = {row[0] for row in rows if not row[3]}
+        self._notify([p for p in tracks if p not in old], [p for p in old if p not in tracks and is_audio_name(p)])
+        return subdirs
+
+    def _kept_duration(self, old, row):
+        if old and old[0] == row[4] and old[1] == row[5]:
+            return old[2]
+        return None
+
+    def annotate(self, cache):
+        # Fill in durations for new or changed tracks. Probed values go straight into the index,
+        # not through the metadata cache: a first scan of a big library would otherwise flush the
+        # recently played entries out of it.
+        with self._lock:
+            pending = [p for (p,) in self._db.execute(
+                "SELECT path FROM entries WHERE is_dir = 0 AND duration IS NULL"
+            )]
+        done = []
+        for path in pending:
+            try:
+                info = cache.get(path, touch=False) or probe(Path(path))
+            except Exception:
+                continue
+            done.append((info.get("duration") or 0.0, path))
+            if len(done) >= ANNOTATE_BATCH:
+                self._store_durations(done)
+                done = []
+        self._store_durations(done)
+        metrics.count("library.annotated", len(pending))
+
+    def _store_durations(self, rows):
+        with self._lock:
+            self._db.executemany("UPDATE entries SET duration = ? WHERE path = ?", rows)
+            self._db.commit()
+
+    # --- Queries ---
+    def is_current(self, directory: Path):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return False
+        with self._lock:
+            row = self._db.execute("SELECT mtime FROM dirs WHERE path = ?", (str(directory),)).fetchone()
+        return row is not None and row[0] == mtime
+
+    def list_dir(self, directory: Path):
+        if not self.is_current(directory):
+            return None
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, is_dir, size, mtime FROM entries WHERE dir = ?", (str(directory),)
+            ).fetchall()
+        return Listing.from_rows(directory, rows)
+
+    def snapshot(self, directory: Path):
+        # The rows stored by the last scan, without checking they are still current
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM dirs WHERE path = ?", (str(directory),)).fetchone() is None:
+                return None
+            rows = self._db.execute(
+                "SELECT name, is_dir, size, mtime FROM entries WHERE dir = ?", (str(directory),)
+            ).fetchall()
+        return Listing.from_rows(directory, rows)
+
+    def tracks(self, directory: Path = None):
+        with self._lock:
+            if directory is None:
+                rows = self._db.execute("SELECT path FROM entries WHERE is_dir = 0").fetchall()
+            else:
+                rows = self._db.execute(
+                    "SELECT path FROM entries WHERE dir = ? AND is_dir = 0", (str(directory),)
+                ).fetchall()
+        return [Path(path) for (path,) in rows]
+
+    def files(self):
+        # (path, size, mtime) for every track
+        with self._lock:
+            return self._db.execute("SELECT path, size, mtime FROM entries WHERE is_dir = 0").fetchall()
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries WHERE is_dir = 0").fetchone()[0]
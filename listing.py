@@ -0,0 +1,176 @@
+import os
+import stat
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import metrics
+
+STREAM_EXTENSIONS = [".m4a", ".aac", ".wma"]
+AUDIO_EXTENSIONS = [".mp3", ".wav", ".flac", ".ogg", ".opus"] + STREAM_EXTENSIONS
+CACHE_ENTRIES = 64
+
+
+def is_audio_name(name):
+    return os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS
+
+
+class Listing:
+    # Parallel arrays, one slot per row shown in the file list
+    __slots__ = ("directory", "names", "paths", "is_dir", "is_audio", "size", "mtime", "_rows")
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.names = []
+        self.paths = []
+        self.is_dir = bytearray()
+        self.is_audio = bytearray()
+        self.size = array("q")
+        self.mtime = array("q")
+        self._rows = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def append(self, name, is_dir, size=0, mtime=0):
+        self.names.append(name)
+        self.paths.append(self.directory / name)
+        self.is_dir.append(1 if is_dir else 0)
+        self.is_audio.append(0 if is_dir else 1)
+        self.size.append(size)
+        self.mtime.append(mtime)
+        self._rows = None
+
+    def insert(self, name, is_dir, size=0, mtime=0):
+        # Keeps the order from_rows sorts into; returns the new row's index
+        index = bisect_left(self.names, name)
+        self.names.insert(index, name)
+        self.paths.insert(index, self.directory / name)
+        self.is_dir.insert(index, 1 if is_dir else 0)
+        self.is_audio.insert(index, 0 if is_dir else 1)
+        self.size.insert(index, size)
+        self.mtime.insert(index, mtime)
+        self._rows = None
+        return index
+
+    def remove(self, index):
+        del self.names[index]
+        del self.paths[index]
+        del self.is_dir[index]
+        del self.is_audio[index]
+        del self.size[index]
+        del self.mtime[index]
+        self._rows = None
+
+    def find(self, name):
+        # Binary search, for folder listings which stay sorted by name
+        index = bisect_left(self.names, name)
+        return index if index < len(self.names) and self.names[index] == name else None
+
+    def index(self, path):
+        if self._rows is None:
+            self._rows = {p: i for i, p in enumerate(self.paths)}
+        return self._rows.get(path)
+
+    def same_rows(self, other):
+        return (self.names == other.names and self.is_dir == other.is_dir
+                and self.size == other.size and self.mtime == other.mtime)
+
+    def audio_indices(self):
+        return [i for i, audio in enumerate(self.is_audio) if audio]
+
+    @classmethod
+    def from_rows(cls, directory, rows):
+        listing = cls(directory)
+        for name, is_dir, size, mtime in sorted(rows):
+            listing.append(name, is_dir, size, mtime)
+        return listing
+
+
+def scan_rows(directory: Path):
+    rows = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                if entry.is_dir():
+                    rows.append((entry.name, True, 0, 0))
+                elif is_audio_name(entry.name):
+                    st = entry.stat()
+                    rows.append((entry.name, False, st.st_size, st.st_mtime_ns))
+            except OSError:
+                continue
+    return rows
+
+
+def scan_listing(directory: Path) -> Listing:
+    return Listing.from_rows(directory, scan_rows(directory))
+
+
+def stat_rows(directory: Path, names):
+    # Current row for each name, or None where the entry is gone or not something the list shows
+    rows = {}
+    for name in names:
+        if not name:
+            continue  # os.path.join(directory, "") is the folder itself
+        try:
+            st = os.stat(os.path.join(directory, name))
+        except OSError:
+            rows[name] = None
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            rows[name] = (name, True, 0, 0)
+        elif is_audio_name(name):
+            rows[name] = (name, False, st.st_size, st.st_mtime_ns)
+        else:
+            rows[name] = None
+    return rows
+
+
+class ListingCache:
+    # Recently listed folders, each checked against the folder's mtime before it is reused.
+    # load(directory) produces a Listing and may run on the prefetch thread.
+    def __init__(self, load, max_entries=CACHE_ENTRIES):
+        self.load = load
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # path -> (mtime, listing)
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="listing")
+
+    def get(self, directory: Path) -> Listing:
+        key = str(directory)
+        mtime = os.stat(key).st_mtime_ns
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self._entries.move_to_end(key)
+                metrics.count("listing.cache_hit")
+                return entry[1]
+        metrics.count("listing.cache_miss")
+        # mtime is read before listing, so a change made meanwhile invalidates the entry
+        listing = self.load(directory)
+        with self._lock:
+            self._entries[key] = (mtime, listing)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return listing
+
+    def prefetch(self, directory: Path):
+        key = str(directory)
+        with self._lock:
+            if key in self._queued:
+                return
+            self._queued.add(key)
+        self._executor.submit(self._prefetch, directory, key)
+
+    def _prefetch(self, directory, key):
+        try:
+            self.get(directory)
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._queued.discard(key)
@@ -0,0 +1,255 @@
+import multiprocessing as mp
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+import numpy as np
+import metrics
+from metadata import CACHE_DIR
+
+RATE = 48000  # the K-weighting coefficients are defined at 48 kHz
+SEGMENT = RATE // 10  # 100 ms, a quarter of an R128 gating block
+CHUNK_SEGMENTS = 100  # decoded and analysed 10 s at a time
+TARGET_LUFS = -18.0  # ReplayGain 2 reference level
+HOLD_SECONDS = 3.0  # analysis backs off this long after playback starts or seeks
+
+# BS.1770 K-weighting: high shelf then RLB high-pass
+K_FILTERS = (
+    ((1.53512485958697, -2.69169618940638, 1.19839281085285), (1.0, -1.69065929318241, 0.73248077421585)),
+    ((1.0, -2.0, 1.0), (1.0, -1.99004745483398, 0.99007225036621)),
+)
+
+
+def k_weights(n=SEGMENT):
+    # Per-bin |H|^2 with the Parseval scaling folded in, so a segment's K-weighted
+    # mean square is just |rfft|^2 @ weights
+    z = np.exp(-1j * 2 * np.pi * np.fft.rfftfreq(n))
+    response = np.ones(len(z))
+    for b, a in K_FILTERS:
+        h = (b[0] + b[1] * z + b[2] * z ** 2) / (a[0] + a[1] * z + a[2] * z ** 2)
+        response *= np.abs(h) ** 2
+    scale = np.full(len(z), 2.0)
+    scale[0] = 1.0
+    if n % 2 == 0:
+        scale[-1] = 1.0
+    return response * scale / n ** 2
+
+
+def integrated_loudness(segments):
+    # segments: K-weighted mean square per 100 ms, summed over channels
+    if len(segments) < 4:
+        return None
+    blocks = np.convolve(segments, np.full(4, 0.25), mode="valid")  # 400 ms blocks, 75% overlap
+    with np.errstate(divide="ignore"):
+        loudness = -0.691 + 10 * np.log10(blocks)
+    gated = blocks[loudness > -70.0]
+    if not len(gated):
+        return None
+    relative = -0.691 + 10 * np.log10(gated.mean()) - 10.0
+    gated = blocks[loudness > max(relative, -70.0)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def track_gain(loudness):
+    # Linear factor for Player volume; pygame cannot amplify, so loud tracks are brought down to the target
+    if not loudness or loudness.get("integrated") is None:
+        return 1.0
+    gain_db = min(TARGET_LUFS - loudness["integrated"], -loudness["peak"])
+    return min(1.0, 10 ** (gain_db / 20))
+
+
+# --- Worker processes ---
+_resume = None
+_stop = None
+
+
+def _init_worker(resume, stop):
+    global _resume, _stop
+    _resume, _stop = resume, stop
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+
+def measure(path, channels=2):
+    channels = max(1, min(int(channels or 2), 2))
+    process = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-nostdin", "-i", str(path), "-vn",
+         "-f", "f32le", "-ac", str(channels), "-ar", str(RATE), "-"],
+        stdout=subprocess.PIPE, stdin=subprocess.DEVNULL,
+    )
+    weights = k_weights()
+    chunk_bytes = SEGMENT * CHUNK_SEGMENTS * channels * 4
+    segments = []
+    peak = 0.0
+    try:
+        while True:
+            # Parked here while the player has asked for the CPU
+            if _resume is not None:
+                _resume.wait()
+            if _stop is not None and _stop.is_set():
+                return None
+            data = process.stdout.read(chunk_bytes)
+            count = len(data) // (SEGMENT * channels * 4)
+            if not count:
+                break
+            pcm = np.frombuffer(data, dtype=np.float32).reshape(-1, channels)
+            peak = max(peak, float(np.abs(pcm).max()))
+            spectrum = np.fft.rfft(pcm[:count * SEGMENT].reshape(count, SEGMENT, channels), axis=1)
+            power = (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis=2)
+            segments.append(power @ weights)
+    finally:
+        process.kill()
+        process.wait()
+    segments = np.concatenate(segments) if segments else np.zeros(0)
+    return {
+        "integrated": integrated_loudness(segments),
+        "peak": float(20 * np.log10(peak)) if peak > 0 else -120.0,
+    }
+
+
+class LoudnessStore:
+    # Measured loudness per track. Unlike the metadata cache this is never trimmed to a size:
+    # a pass over a big library would otherwise evict its own results and start over every launch.
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else CACHE_DIR / "loudness.db"
+        self._lock = threading.Lock()
+        try:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Loudness store unavailable, using memory: {e}")
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS loudness ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, integrated REAL, peak REAL)"
+        )
+        self._db.commit()
+
+    def get(self, filepath):
+        # {"integrated", "peak"} measured for the file as it is now, or None
+        try:
+            path = str(Path(filepath).resolve())
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime, integrated, peak FROM loudness WHERE path = ?", (path,)
+            ).fetchone()
+        if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+            return None
+        return {"integrated": row[2], "peak": row[3]}
+
+    def put(self, filepath, result):
+        path = str(Path(filepath).resolve())
+        st = os.stat(path)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO loudness (path, size, mtime, integrated, peak) VALUES (?, ?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, result["integrated"], result["peak"]),
+            )
+            self._db.commit()
+
+    def retain(self, paths):
+        # Forget tracks that are no longer in the library
+        keep = {str(Path(p).resolve()) for p in paths}
+        with self._lock:
+            gone = [(p,) for (p,) in self._db.execute("SELECT path FROM loudness") if p not in keep]
+            self._db.executemany("DELETE FROM loudness WHERE path = ?", gone)
+            self._db.commit()
+
+
+class LoudnessAnalyzer:
+    # Works through the library in a low-priority process pool, keeping only a handful of
+    # files in flight. hold() parks the workers between chunks while playback needs the CPU.
+    def __init__(self, store, metadata, workers=None):
+        self.store = store
+        self.metadata = metadata
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.hold_until = 0.0
+        ctx = mp.get_context("spawn")
+        self._resume = ctx.Event()
+        self._resume.set()
+        self._stop = ctx.Event()
+        self._executor = None
+        self._ctx = ctx
+        self._thread = None
+        self._running = False
+
+    def start(self, paths):
+        if self._running:
+            return
+        if not shutil.which("ffmpeg"):
+            print("Loudness analysis unavailable: ffmpeg not found")
+            return
+        self._running = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(list(paths),), name="loudness", daemon=True)
+        self._thread.start()
+
+    def hold(self, seconds=HOLD_SECONDS):
+        self.hold_until = max(self.hold_until, time.time() + seconds)
+        self._resume.clear()
+
+    def _held(self):
+        if time.time() < self.hold_until:
+            return True
+        self._resume.set()
+        return False
+
+    def _run(self, paths):
+        in_flight = {}
+        try:
+            self.store.retain(paths)
+            for path in paths:
+                if not self._running:
+                    break
+                if self.store.get(path) is not None:
+                    continue
+                info = self.metadata.get(path)
+                while self._running and (self._held() or len(in_flight) >= self.workers):
+                    self._collect(in_flight, timeout=0.2)
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        self.workers, mp_context=self._ctx,
+                        initializer=_init_worker, initargs=(self._resume, self._stop),
+                    )
+                channels = (info or {}).get("channels") or 2
+                in_flight[self._executor.submit(measure, path, channels)] = path
+            while self._running and in_flight:
+                self._held()
+                self._collect(in_flight, timeout=0.2)
+        except Exception as e:
+            print(f"Loudness analysis failed: {e}")
+        self.shutdown()
+
+    def _collect(self, in_flight, timeout):
+        if not in_flight:
+            time.sleep(timeout)
+            return
+        done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            path = in_flight.pop(future)
+            try:
+                result = future.result()
+                if result is not None:
+                    self.store.put(path, result)
+                    metrics.count("loudness.analyzed")
+            except Exception as e:
+                metrics.count("loudness.error")
+                print(f"Loudness analysis of {path.name} failed: {e}")
+
+    def shutdown(self):
+        self._running = False
+        self._stop.set()
+        self._resume.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -1,7 +1,33 @@
-import tkinter as tk
-from ui import SLMP
+import metrics
+import argparse
+from pathlib import Path
 
-root = tk.Tk()
-app = SLMP(root)
-root.mainloop()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SLMP - Simple Local Music Player")
+    parser.add_argument("--metrics", action="store_true", help=f"record timings to {metrics.LOG_DIR}/slmp-metrics.log (or set {metrics.ENV_VAR}=1)")
+    parser.add_argument("--startup-report", action="store_true", help="print how long each startup step took")
+    parser.add_argument("--daemon", action="store_true", help="run without a window, controlled through slmpctl.py")
+    parser.add_argument("--duplicates", action="store_true", help="scan ~/Music, print groups of identical tracks and exit")
+    parser.add_argument("--socket", type=Path, help="control socket for --daemon (default $XDG_RUNTIME_DIR/slmp.sock)")
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.enable()
+    else:
+        metrics.enable_from_env()
 
+    if args.duplicates:
+        from library import LibraryIndex
+        from duplicates import DuplicateFinder, report
+        library = LibraryIndex(Path.home() / "Music")
+        library.scan()
+        print(report(DuplicateFinder().find(library.files())))
+    elif args.daemon:
+        from daemon import Daemon
+        Daemon(Path.home() / "Music", args.socket).run()
+    else:
+        import tkinter as tk
+        from ui import SLMP
+        metrics.mark("imports")
+        root = tk.Tk()
+        app = SLMP(root, startup_report=args.startup_report)
+        root.mainloop()
@@ -0,0 +1,147 @@
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from pathlib import Path
+import metrics
+from containers import read_info
+
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "slmp"
+
+
+def probe_ffprobe(filepath: Path) -> dict:
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_format", "-show_streams", "-of", "json", str(filepath)],
+        capture_output=True, text=True
+    )
+    data = json.loads(result.stdout)
+    fmt = data.get("format", {})
+    streams = data.get("streams", [])
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    return {
+        "duration": float(fmt.get("duration") or audio.get("duration") or 0.0),
+        "codec": audio.get("codec_name"),
+        "sample_rate": int(audio.get("sample_rate") or 0),
+        "channels": int(audio.get("channels") or 0),
+        "bit_rate": int(fmt.get("bit_rate") or audio.get("bit_rate") or 0),
+        "format": fmt,
+        "streams": streams,
+    }
+
+
+def probe(filepath: Path) -> dict:
+    try:
+        with metrics.timed("metadata.native"):
+            return read_info(filepath)
+    except (ValueError, OSError):
+        metrics.count("metadata.ffprobe")
+        with metrics.timed("metadata.ffprobe"):
+            return probe_ffprobe(filepath)
+
+
+class MetadataCache:
+    def __init__(self, db_path=None, max_entries=20000):
+        self.db_path = Path(db_path) if db_path else CACHE_DIR / "metadata.db"
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        try:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Metadata cache unavailable, using memory: {e}")
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, used REAL, data TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS metadata_used ON metadata(used)")
+        self._db.commit()
+        self._count = self._db.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+
+    def _key(self, filepath, st=None):
+        path = str(Path(filepath).resolve())
+        return path, st or os.stat(path)
+
+    def get(self, filepath, st=None, touch=True):
+        # touch=False only reads: no stats, no LRU bump, stale rows left for the next real lookup
+        try:
+            path, st = self._key(filepath, st)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime, data FROM metadata WHERE path = ?", (path,)
+            ).fetchone()
+            current = row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns
+            if not touch:
+                return json.loads(row[2]) if current else None
+            if row is None:
+                self.misses += 1
+                metrics.count("metadata.miss")
+                return None
+            if not current:
+                # File changed since it was probed
+                self._db.execute("DELETE FROM metadata WHERE path = ?", (path,))
+                self._db.commit()
+                self._count -= 1
+                self.misses += 1
+                metrics.count("metadata.stale")
+                return None
+            self._db.execute("UPDATE metadata SET used = ? WHERE path = ?", (time.time(), path))
+            self._db.commit()
+            self.hits += 1
+        metrics.count("metadata.hit")
+        return json.loads(row[2])
+
+    def put(self, filepath, info, st=None):
+        path, st = self._key(filepath, st)
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO metadata (path, size, mtime, used, data) VALUES (?, ?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, time.time(), json.dumps(info)),
+            )
+            if cur.rowcount:
+                self._count += 1
+            else:
+                self._db.execute(
+                    "UPDATE metadata SET size = ?, mtime = ?, used = ?, data = ? WHERE path = ?",
+                    (st.st_size, st.st_mtime_ns, time.time(), json.dumps(info), path),
+                )
+            if self._count > self.max_entries:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        # Drop the least recently used entries plus some slack so eviction is not run on every put
+        excess = self._count - int(self.max_entries * 0.9)
+        self._db.execute(
+            "DELETE FROM metadata WHERE path IN (SELECT path FROM metadata ORDER BY used LIMIT ?)",
+            (excess,),
+        )
+        self._count = self._db.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+
+    def lookup(self, filepath: Path) -> dict:
+        st = os.stat(filepath)
+        info = self.get(filepath, st)
+        if info is None:
+            info = probe(filepath)
+            self.put(filepath, info, st)
+        return info
+
+    def update(self, filepath, **fields):
+        # Merge extra per-track results (e.g. loudness) into the probed entry
+        info = dict(self.lookup(filepath))
+        info.update(fields)
+        self.put(filepath, info)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": self._count}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,167 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+ENV_VAR = "SLMP_METRICS"
+LOG_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "slmp"
+LOG_BYTES = 1_000_000
+LOG_BACKUPS = 3
+DUMP_INTERVAL = 10.0
+# Histogram bucket upper bounds in milliseconds
+BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 5000, float("inf"))
+
+# Every recording call checks this first, so instrumentation costs one global lookup when off
+enabled = False
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_log = None
+_NULL = nullcontext()
+# main imports this module first, so startup marks are measured from close to launch
+STARTED = time.perf_counter()
+_marks = []
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect_left(BUCKETS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th sample, capped by the largest seen value
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= target:
+                return round(min(bound, self.max), 3)
+        return round(self.max, 3)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": round(self.max, 3),
+        }
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def count(name, n=1):
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def observe(name, seconds):
+    if not enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(seconds * 1000)
+
+
+def timed(name):
+    return _Timer(name) if enabled else _NULL
+
+
+def trace(name, **fields):
+    if enabled:
+        _log.info(json.dumps({"t": round(time.time(), 3), "event": name, **fields}, default=str))
+
+
+def mark(name):
+    # Startup milestones are kept even with metrics off, there are only a handful per run
+    elapsed = time.perf_counter() - STARTED
+    _marks.append((name, elapsed))
+    observe(f"startup.{name}", elapsed)
+
+
+def startup_report():
+    lines = ["Startup (ms since launch):"]
+    previous = 0.0
+    for name, elapsed in sorted(_marks, key=lambda m: m[1]):
+        lines.append(f"  {name:<12} {elapsed * 1000:8.1f}  (+{(elapsed - previous) * 1000:.1f})")
+        previous = elapsed
+    return "\n".join(lines)
+
+
+def snapshot():
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "histograms": {name: h.summary() for name, h in _histograms.items()},
+        }
+
+
+def dump():
+    if enabled:
+        _log.info(json.dumps({"t": round(time.time(), 3), "pid": os.getpid(), "metrics": snapshot()}))
+
+
+def _dump_loop():
+    while True:
+        time.sleep(DUMP_INTERVAL)
+        dump()
+
+
+def enable(name="slmp"):
+    # Each process gets its own rotating log; children inherit the env var and call enable_from_env
+    global enabled, _log
+    if enabled:
+        return
+    os.environ[ENV_VAR] = "1"
+    try:
+        LOG_DIR.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(LOG_DIR / f"{name}-metrics.log", maxBytes=LOG_BYTES, backupCount=LOG_BACKUPS)
+    except OSError as e:
+        print(f"Metrics log unavailable: {e}")
+        return
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _log = logging.getLogger(f"slmp.metrics.{name}")
+    _log.setLevel(logging.INFO)
+    _log.propagate = False
+    _log.addHandler(handler)
+    enabled = True
+    threading.Thread(target=_dump_loop, name="metrics-dump", daemon=True).start()
+    atexit.register(dump)
+
+
+def enable_from_env(name="slmp"):
+    if os.environ.get(ENV_VAR, "") not in ("", "0"):
+        enable(name)
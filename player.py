@@ -1,15 +1,32 @@
 import pygame
 import threading
 import time
-import subprocess
+from collections import deque
 from pathlib import Path
+import metrics
+from metadata import MetadataCache
+from stream import FFmpegStream
+from loudness import LoudnessStore, track_gain
+from seektable import FileSlice, SeekTableCache, mp3_frame_at
+from listing import STREAM_EXTENSIONS
 
-AUDIO_EXTENSIONS = [".mp3", ".wav", ".flac", ".ogg", ".opus"]
 
 class Player:
-    def __init__(self, on_finish_callback):
+    def __init__(self, on_finish_callback, metadata=None, seek_tables=None, loudness=None):
+        # Only the mixer: SDL video next to Tk, with its events read off the main thread, is not safe
+        # everywhere (macOS), so track ends are detected by watching the mixer in poll()
         pygame.mixer.init()
+        pygame.mixer.set_reserved(1)
+        self.channel = pygame.mixer.Channel(0)
+        self.stream = None
+        self.volume = 1.0
+        self.gain = 1.0
         self.on_finish_callback = on_finish_callback
+        self.metadata = metadata or MetadataCache()
+        self.seek_tables = seek_tables or SeekTableCache()
+        self.loudness = loudness or LoudnessStore()
+        self.seek_table = None
+        self.pos_base = 0.0  # track position at which mixer.music.get_pos() last restarted from 0
         self.current_file = None
         self.looping = False
         self.paused = False
@@ -17,78 +34,251 @@ class Player:
         self.pause_start = None
         self.total_paused_time = 0.0
         self.duration = 0.0
-        self._monitor_thread = None
-        self._stop_flag = False
+        self.next_file = None
+        self.last_gap_ms = None
+        self.gap_history = deque(maxlen=100)
+        self._ended_at = None
+        self._busy = False
+        self._last_pos = -1
 
     def play(self, filepath: Path, loop: bool = False):
+        ended_at = self._ended_at
         self.stop()
         self.current_file = filepath.resolve()
         self.looping = loop
-        self._stop_flag = False
         try:
-            pygame.mixer.music.load(str(self.current_file))
-            pygame.mixer.music.play(loops=-1 if loop else 0)
+            with metrics.timed("player.load"):
+                self._start(self.current_file, loop)
+            metrics.count("player.play")
             self.start_time = time.time()
             self.total_paused_time = 0.0
             self.pause_start = None
             self.paused = False
-            self.duration = self.get_duration(filepath)
-            self._monitor_thread = threading.Thread(target=self._monitor_playback, daemon=True)
-            self._monitor_thread.start()
+            self.pos_base = 0.0
+            if ended_at is not None:
+                self._record_gap(self.start_time - ended_at)
+            self._load_duration(self.current_file)
+            self._load_seek_table(self.current_file)
         except Exception as e:
+            metrics.count("player.error")
             print(f"Error playing file: {e}")
 
-    def _monitor_playback(self):
-        while pygame.mixer.music.get_busy():
-            if self._stop_flag:
+    def _start(self, filepath: Path, loop):
+        if filepath.suffix.lower() not in STREAM_EXTENSIONS:
+            try:
+                pygame.mixer.music.load(str(filepath))
+                pygame.mixer.music.play(loops=-1 if loop else 0)
                 return
-            time.sleep(0.5)
-        if not self.paused and not self.looping and not self._stop_flag:
-            self.on_finish_callback()
+            except pygame.error as e:
+                print(f"Mixer cannot open {filepath.name} ({e}), decoding with ffmpeg")
+        metrics.count("player.stream")
+        self.stream = FFmpegStream(filepath, self.channel)
+
+    def queue(self, filepath: Path):
+        # Gapless: the mixer switches to the queued file itself when the current one ends.
+        # Streamed files hand over through on_finish instead.
+        filepath = filepath.resolve()
+        if filepath == self.next_file or self.start_time is None:
+            return
+        if self.stream is not None or filepath.suffix.lower() in STREAM_EXTENSIONS:
+            return
+        try:
+            pygame.mixer.music.queue(str(filepath))
+            self.next_file = filepath
+        except Exception as e:
+            print(f"Queue failed: {e}")
+
+    def _load_duration(self, filepath: Path):
+        info = self.metadata.get(filepath)
+        self._apply_gain(self.loudness.get(filepath) or {})
+        if info:
+            self.duration = info.get("duration") or 0.0
+        else:
+            # Never hold up playback on a probe, fill the duration in when it arrives
+            self.duration = 0.0
+            threading.Thread(target=self._probe_duration, args=(filepath,), daemon=True).start()
+
+    def _probe_duration(self, filepath: Path):
+        duration = self.get_duration(filepath)
+        if self.current_file == filepath:
+            self.duration = duration
+
+    def _load_seek_table(self, filepath: Path):
+        self.seek_table = self.seek_tables.get(filepath)
+        if self.seek_table is None:
+            threading.Thread(target=self._build_seek_table, args=(filepath,), daemon=True).start()
+
+    def _build_seek_table(self, filepath: Path):
+        try:
+            table = self.seek_tables.lookup(filepath)
+        except (OSError, ValueError):
+            return
+        if self.current_file == filepath:
+            self.seek_table = table
+
+    def poll(self):
+        # Called periodically by whoever owns the mixer (the engine thread in the app)
+        if self.stream is not None:
+            self._poll_stream()
+            return
+        busy = pygame.mixer.music.get_busy()
+        pos = pygame.mixer.music.get_pos()
+        # The mixer stopped on its own, or restarted its position on the queued file
+        switched = self.next_file is not None and 0 <= pos < self._last_pos
+        ended = (self._busy and not busy and not self.paused) or switched
+        self._busy, self._last_pos = busy, pos
+        if not ended or self.start_time is None or self.looping:
+            return
+        if self.next_file is not None and busy:
+            self._advance_to_queued(pos)
+        else:
+            self._ended_at = min(time.time(), self._expected_end())
+        self.on_finish_callback()
+
+    def _poll_stream(self):
+        if self.paused:
+            return
+        if self.stream.pump():
+            # Clock from the moment audio actually started, not from when decoding was requested
+            self.start_time = self.stream.started_at - self.stream.offset
+            self.total_paused_time = 0.0
+        if not self.stream.finished():
+            return
+        if self.looping:
+            self.stream.start(0.0)
+            return
+        self._ended_at = min(time.time(), self._expected_end())
+        self.stream.close()
+        self.stream = None
+        self.on_finish_callback()
+
+    def _advance_to_queued(self, pos):
+        started = time.time() - max(pos, 0) / 1000
+        self._record_gap(started - self._expected_end())
+        self.current_file = self.next_file
+        self.next_file = None
+        self.start_time = started
+        self.total_paused_time = 0.0
+        self.pause_start = None
+        self.pos_base = 0.0
+        self._load_duration(self.current_file)
+        self._load_seek_table(self.current_file)
+
+    def _expected_end(self):
+        if self.start_time is None or self.duration <= 0:
+            return time.time()
+        return self.start_time + self.total_paused_time + self.duration
+
+    def _record_gap(self, seconds):
+        self._ended_at = None
+        self.last_gap_ms = max(0.0, seconds * 1000)
+        self.gap_history.append(self.last_gap_ms)
+        metrics.observe("player.gap", self.last_gap_ms / 1000)
+
+    def gap_stats(self):
+        if not self.gap_history:
+            return {"count": 0}
+        gaps = sorted(self.gap_history)
+        return {
+            "count": len(gaps),
+            "last_ms": round(self.last_gap_ms, 1),
+            "mean_ms": round(sum(gaps) / len(gaps), 1),
+            "max_ms": round(gaps[-1], 1),
+        }
 
     def toggle_pause(self):
         if self.paused:
-            pygame.mixer.music.unpause()
+            if self.stream:
+                self.channel.unpause()
+            else:
+                pygame.mixer.music.unpause()
             self.total_paused_time += time.time() - self.pause_start
             self.pause_start = None
             self.paused = False
         else:
-            pygame.mixer.music.pause()
+            if self.stream:
+                self.channel.pause()
+            else:
+                pygame.mixer.music.pause()
             self.pause_start = time.time()
             self.paused = True
 
     def stop(self):
+        # Halting the mixer also drops the queued file; poll() must not take this for a track end
         pygame.mixer.music.stop()
-        self._stop_flag = True
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.next_file = None
+        self._ended_at = None
+        self._busy = False
+        self._last_pos = -1
         self.paused = False
         self.start_time = None
         self.pause_start = None
         self.total_paused_time = 0.0
         self.duration = 0.0
 
+    def set_volume(self, volume: float):
+        self.volume = volume
+        self._apply_gain()
+
+    def _apply_gain(self, loudness=None):
+        # Slider value times the track's loudness correction
+        if loudness is not None:
+            self.gain = track_gain(loudness)
+        pygame.mixer.music.set_volume(self.volume * self.gain)
+        self.channel.set_volume(self.volume * self.gain)
+
     def seek(self, seconds: float):
         try:
-            pygame.mixer.music.set_pos(seconds)
+            if self.stream:
+                self.stream.start(seconds)
+            else:
+                seconds = self._seek_music(seconds)
             self.start_time = time.time() - seconds
             self.total_paused_time = 0.0
             self.pause_start = None
         except Exception as e:
             print(f"Seek failed: {e}")
 
+    def _seek_music(self, seconds):
+        table = self.seek_table
+        if table is not None and table.kind == "mp3" and not self.looping:
+            # Byte-accurate: restart the decoder at the frame itself instead of letting it scan for it
+            seconds, offset = mp3_frame_at(self.current_file, table, seconds)
+            pygame.mixer.music.load(FileSlice(self.current_file, offset), "mp3")
+            pygame.mixer.music.play()
+            if self.paused:
+                pygame.mixer.music.pause()
+            self._last_pos = -1
+            if self.next_file is not None:
+                pygame.mixer.music.queue(str(self.next_file))
+            self.pos_base = seconds
+            return seconds
+        if self.duration > 0:
+            seconds = min(seconds, self.duration)
+        pygame.mixer.music.set_pos(seconds)
+        self._last_pos = -1  # a seek is not the queued file starting
+        self.pos_base = seconds - max(pygame.mixer.music.get_pos(), 0) / 1000
+        return seconds
+
     def get_duration(self, filepath: Path) -> float:
         try:
-            result = subprocess.run(
-                ["ffprobe", "-v", "error", "-show_entries", "format=duration",
-                 "-of", "default=noprint_wrappers=1:nokey=1", str(filepath)],
-                capture_output=True, text=True
-            )
-            return float(result.stdout.strip())
+            return float(self.metadata.lookup(filepath).get("duration") or 0.0)
         except Exception:
             return 0.0
 
     def get_elapsed(self) -> float:
         if not self.start_time:
             return 0.0
+        pos = pygame.mixer.music.get_pos() if self.stream is None else -1
+        if pos >= 0:
+            # Audio the mixer has actually played, so pauses and seeks need no wall-clock bookkeeping
+            elapsed = self.pos_base + pos / 1000
+            if self.looping and self.duration > 0:
+                return elapsed % self.duration
+            return min(elapsed, self.duration) if self.duration > 0 else elapsed
         if self.paused and self.pause_start:
             paused_elapsed = self.pause_start - self.start_time - self.total_paused_time
             return min(paused_elapsed, self.duration)
@@ -98,6 +288,8 @@ class Player:
         return min(elapsed, self.duration)
 
     def is_playing(self):
+        if self.stream is not None:
+            return not self.paused and not self.stream.finished()
         return pygame.mixer.music.get_busy() and not self.paused
 
 
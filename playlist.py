@@ -0,0 +1,274 @@
+import os
+from array import array
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+import session
+from metadata import CACHE_DIR
+
+PLAYLIST_EXTENSIONS = (".m3u", ".m3u8", ".pls")
+QUEUE_PATH = CACHE_DIR / "queue.m3u8"
+UNKNOWN, AVAILABLE, MISSING = 0, 1, 2
+
+
+def resolve(location, base: str) -> str:
+    # Plain string work, this runs for every row that is shown, deduplicated or saved
+    if "://" in location:
+        url = urlparse(location)
+        if url.scheme != "file":
+            return location  # a stream, never a playable local file
+        location = unquote(url.path)
+    elif os.sep == "/" and "\\" in location:
+        location = location.replace("\\", "/")  # written on Windows
+    if location.startswith("~"):
+        location = os.path.expanduser(location)
+    return os.path.normpath(os.path.join(base, location))
+
+
+# --- Reading ---
+def read_m3u(path):
+    # Yields (location, duration) one line at a time. M3U8 is UTF-8; bytes of legacy M3U files
+    # that are not survive the round trip through surrogateescape.
+    duration = -1.0
+    with open(path, encoding="utf-8-sig", errors="surrogateescape") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#"):
+                if line.startswith("#EXTINF:"):
+                    try:
+                        duration = float(line[8:].split(",", 1)[0].split()[0])
+                    except (ValueError, IndexError):
+                        duration = -1.0
+                continue
+            yield line, duration
+            duration = -1.0
+
+
+def read_pls(path):
+    # FileN/LengthN pairs; an entry is complete once a later FileN shows up
+    pending = {}
+    with open(path, encoding="utf-8-sig", errors="surrogateescape") as f:
+        for line in f:
+            key, sep, value = line.strip().partition("=")
+            key = key.strip().lower()
+            if not sep:
+                continue
+            if key.startswith("file") and key[4:].isdigit():
+                number = int(key[4:])
+                for done in sorted(n for n in pending if n < number):
+                    location, duration = pending.pop(done)
+                    if location:
+                        yield location, duration
+                pending.setdefault(number, [None, -1.0])[0] = value.strip()
+            elif key.startswith("length") and key[6:].isdigit():
+                try:
+                    pending.setdefault(int(key[6:]), [None, -1.0])[1] = float(value)
+                except ValueError:
+                    pass
+    for number in sorted(pending):
+        location, duration = pending[number]
+        if location:
+            yield location, duration
+
+
+def load(path: Path):
+    path = Path(path)
+    reader = read_pls if path.suffix.lower() == ".pls" else read_m3u
+    playlist = Playlist(path.parent.resolve(), path.stem)
+    for location, duration in reader(path):
+        playlist.append(location, duration)
+    return playlist
+
+
+# --- Writing ---
+def write(playlist, path: Path):
+    # Written beside the target and swapped in, relative to the playlist's folder where possible
+    path = Path(path)
+    prefix = str(path.parent.resolve()) + os.sep
+    tmp = path.with_name(path.name + ".tmp")
+    pls = path.suffix.lower() == ".pls"
+    with open(tmp, "w", encoding="utf-8", errors="surrogateescape") as f:
+        f.write("[playlist]\n" if pls else "#EXTM3U\n")
+        for i in range(len(playlist)):
+            location = playlist.resolved(i)
+            if location.startswith(prefix):
+                location = location[len(prefix):]
+            duration = playlist.duration(i)
+            if pls:
+                f.write(f"File{i + 1}={location}\nLength{i + 1}={int(duration) if duration else -1}\n")
+            else:
+                if duration:
+                    title = os.path.splitext(os.path.basename(location))[0]
+                    f.write(f"#EXTINF:{int(round(duration))},{title}\n")
+                f.write(f"{location}\n")
+        if pls:
+            f.write(f"NumberOfEntries={len(playlist)}\nVersion=2\n")
+    os.replace(tmp, path)
+
+
+# --- Queue persistence ---
+def save_queue(playlist, index, elapsed):
+    try:
+        QUEUE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        write(playlist, QUEUE_PATH)
+    except OSError as e:
+        print(f"Saving the queue failed: {e}")
+        return
+    session.save(playlist={"base": str(playlist.base), "name": playlist.name, "index": index, "elapsed": elapsed})
+
+
+def load_queue():
+    # The queue and position saved by the last session, or None
+    saved = session.load().get("playlist")
+    if not saved or not QUEUE_PATH.exists():
+        return None
+    playlist = load(QUEUE_PATH)
+    playlist.base = Path(saved.get("base") or playlist.base)
+    playlist.name = saved.get("name") or playlist.name
+    return playlist, saved.get("index"), saved.get("elapsed") or 0.0
+
+
+def forget_queue():
+    session.save(playlist=None)
+
+
+class Playlist:
+    # Entry locations live in one UTF-8 blob with an offsets array, and the play order is an
+    # array of entry numbers, so 100k entries cost a few MB and reordering never copies strings.
+    # Paths are resolved, and checked on disk, only when a row is actually looked at.
+    def __init__(self, base: Path, name="Playlist"):
+        self.base = base
+        self.name = name
+        self.order = array("l")
+        self.durations = array("f")
+        self.status = bytearray()
+        self._blob = bytearray()
+        self._offsets = array("q", [0])
+
+    @property
+    def base(self):
+        return self._basepath
+
+    @base.setter
+    def base(self, base):
+        self._basepath = Path(base)
+        self._base = str(base)
+
+    def __len__(self):
+        return len(self.order)
+
+    def append(self, location, duration=-1.0):
+        self._blob += location.encode("utf-8", "surrogateescape")
+        self._offsets.append(len(self._blob))
+        self.durations.append(duration)
+        self.status.append(UNKNOWN)
+        self.order.append(len(self.durations) - 1)
+
+    def location(self, index):
+        entry = self.order[index]
+        return self._blob[self._offsets[entry]:self._offsets[entry + 1]].decode("utf-8", "surrogateescape")
+
+    def path(self, index) -> Path:
+        return Path(self.resolved(index))
+
+    def resolved(self, index):
+        return resolve(self.location(index), self._base)
+
+    def duration(self, index):
+        duration = self.durations[self.order[index]]
+        return duration if duration > 0 else None
+
+    def available(self, index):
+        entry = self.order[index]
+        if self.status[entry] == UNKNOWN:
+            self.status[entry] = AVAILABLE if os.path.isfile(self.resolved(index)) else MISSING
+        return self.status[entry] == AVAILABLE
+
+    def known_missing(self, index):
+        return self.status[self.order[index]] == MISSING
+
+    def move(self, index, to):
+        entry = self.order.pop(index)
+        self.order.insert(to, entry)
+
+    def remove(self, index):
+        del self.order[index]
+
+    def dedup(self):
+        # Keeps the first occurrence of every file; returns how many rows went
+        seen = set()
+        order = array("l")
+        for i, entry in enumerate(self.order):
+            key = self.resolved(i)
+            if key not in seen:
+                seen.add(key)
+                order.append(entry)
+        removed = len(self.order) - len(order)
+        self.order = order
+        return removed
+
+
+class _Column:
+    # Read-only sequence computed per row, so a view over a huge playlist allocates nothing up front
+    __slots__ = ("_playlist", "_get")
+
+    def __init__(self, playlist, get):
+        self._playlist = playlist
+        self._get = get
+
+    def __len__(self):
+        return len(self._playlist)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._get(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._get(index)
+
+    def __iter__(self):
+        return (self._get(i) for i in range(len(self)))
+
+
+class PlaylistView:
+    # The parts of the Listing interface the file list uses, backed by a Playlist.
+    # Missing files read as not audio, so the next-track logic steps over them.
+    def __init__(self, playlist: Playlist):
+        self.playlist = playlist
+        self.directory = playlist.base
+        self.names = _Column(playlist, lambda i: os.path.basename(playlist.resolved(i)))
+        self.paths = _Column(playlist, playlist.path)
+        self.is_dir = _Column(playlist, lambda i: 0)
+        self.is_audio = _Column(playlist, lambda i: 1 if playlist.available(i) else 0)
+        self._rows = None
+
+    def __len__(self):
+        return len(self.playlist)
+
+    def invalidate(self):
+        self._rows = None
+
+    def swap(self, a, b):
+        # Adjacent moves only trade two rows, so the lookup table survives them
+        self.playlist.move(a, b)
+        if self._rows is not None and abs(a - b) == 1:
+            first, second = self.playlist.resolved(a), self.playlist.resolved(b)
+            if self._rows.get(first) == b and self._rows.get(second) == a:
+                self._rows[first], self._rows[second] = a, b
+                return
+        self._rows = None
+
+    def index(self, path):
+        if self._rows is None:
+            rows = {}
+            for i in range(len(self.playlist) - 1, -1, -1):
+                rows[self.playlist.resolved(i)] = i  # backwards, so duplicates map to their first row
+            self._rows = rows
+        return self._rows.get(str(path))
+
+    def audio_indices(self):
+        # Unchecked rows count as playable; they are checked when picked
+        return [i for i in range(len(self.playlist)) if not self.playlist.known_missing(i)]
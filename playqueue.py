@@ -0,0 +1,59 @@
+import random
+from array import array
+from collections import deque
+from pathlib import Path
+
+
+class PlayQueue:
+    # Shuffle bag over integer track IDs (indices into self.paths). Every track plays once
+    # before any repeats, and next/peek are O(1) apart from the reshuffle when a bag runs out.
+    def __init__(self, history=200):
+        self.paths = []
+        self.scope = None
+        self.bag = array("l")
+        self.position = 0
+        self.history = deque(maxlen=history)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def load(self, paths, scope=None, current: Path = None):
+        self.paths = list(paths)
+        self.scope = scope
+        self.bag = array("l", range(len(self.paths)))
+        self._shuffle(avoid=current)
+
+    def _shuffle(self, avoid=None):
+        # Fisher-Yates in place
+        bag = self.bag
+        for i in range(len(bag) - 1, 0, -1):
+            j = random.randint(0, i)
+            bag[i], bag[j] = bag[j], bag[i]
+        self.position = 0
+        # Never start a bag with the track that just played
+        if avoid is not None and len(bag) > 1 and self.paths[bag[0]] == avoid:
+            j = random.randrange(1, len(bag))
+            bag[0], bag[j] = bag[j], bag[0]
+
+    def peek(self):
+        if not self.bag:
+            return None
+        if self.position >= len(self.bag):
+            self._shuffle(avoid=self.history[-1] if self.history else None)
+        return self.paths[self.bag[self.position]]
+
+    def next(self):
+        track = self.peek()
+        if track is not None:
+            self.position += 1
+        return track
+
+    def played(self, track: Path):
+        if not self.history or self.history[-1] != track:
+            self.history.append(track)
+
+    def previous(self):
+        if len(self.history) < 2:
+            return None
+        self.history.pop()
+        return self.history[-1]
@@ -0,0 +1,70 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MetadataPrefetcher:
+    def __init__(self, cache, seek_tables=None, workers=4):
+        self.cache = cache
+        self.seek_tables = seek_tables
+        self.results = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._futures = []
+
+    def start(self, paths):
+        # Paths are probed in the order given, so callers put visible rows first
+        self.cancel()
+        with self._lock:
+            generation = self._generation
+            self._futures = [self._executor.submit(self._probe, generation, p) for p in paths]
+
+    def add(self, paths):
+        # More work for the current generation, e.g. files that appeared in the open folder
+        with self._lock:
+            generation = self._generation
+            self._futures.extend(self._executor.submit(self._probe, generation, p) for p in paths)
+
+    def cancel(self):
+        with self._lock:
+            self._generation += 1
+            for future in self._futures:
+                future.cancel()
+            self._futures = []
+
+    def warm(self, path):
+        # One-off probe outside the listing generation, e.g. for the track queued next
+        self._executor.submit(self._warm, path)
+
+    def _warm(self, path):
+        try:
+            self.cache.lookup(path)
+            if self.seek_tables is not None:
+                self.seek_tables.lookup(path)
+        except Exception:
+            pass
+
+    def _probe(self, generation, path):
+        if generation != self._generation:
+            return
+        try:
+            info = self.cache.lookup(path)
+        except Exception:
+            return
+        self.results.put((generation, path, info))
+
+    def drain(self, limit=200):
+        batch = []
+        while len(batch) < limit:
+            try:
+                generation, path, info = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if generation == self._generation:
+                batch.append((path, info))
+        return batch
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,208 @@
+import os
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from pathlib import Path
+import numpy as np
+
+MIN_QUERY = 2
+BUILD_BATCH = 2000  # documents indexed between GIL yields while building
+SCAN_OVER = 5000  # past this many candidates or matches, whole-index text scans beat per-document checks
+
+_separators = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text):
+    # Case-, accent- and punctuation-insensitive form used for both documents and queries
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.casefold()
+    return _separators.sub(" ", text).strip()
+
+
+def trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    # In-memory trigram index over "folder/.../name" of every library track, relative to root.
+    # Documents are integer IDs; removed ones are tombstoned and dropped from postings on rebuild.
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.paths = []
+        self.keys = []
+        self.names = []
+        self.ids = {}
+        self.postings = {}
+        self.removed = 0
+        self._last = ("", None)  # previous query and its full match list
+        self._texts = None  # keys and names joined for scanning, rebuilt after changes
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _relative(self, path):
+        try:
+            return os.path.relpath(path, self.root)
+        except ValueError:
+            return str(path)
+
+    def _add(self, path):
+        path = str(path)
+        if path in self.ids:
+            return
+        doc = len(self.paths)
+        relative = self._relative(path)
+        key = normalize(relative)
+        self.ids[path] = doc
+        self.paths.append(relative)
+        self.keys.append(key)
+        self.names.append(normalize(os.path.splitext(os.path.basename(path))[0]))
+        for gram in trigrams(key):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array("i")
+            posting.append(doc)
+
+    def build(self, paths):
+        fresh = SearchIndex(self.root)
+        for i, path in enumerate(paths):
+            fresh._add(path)
+            if i % BUILD_BATCH == BUILD_BATCH - 1:
+                time.sleep(0)  # let the Tk thread run
+        fresh._joined()
+        with self._lock:
+            self.paths, self.keys, self.names = fresh.paths, fresh.keys, fresh.names
+            self.ids, self.postings, self.removed = fresh.ids, fresh.postings, 0
+            self._last = ("", None)
+            self._texts = fresh._texts
+
+    def update(self, added, removed):
+        with self._lock:
+            for path in removed:
+                doc = self.ids.pop(str(path), None)
+                if doc is not None:
+                    self.keys[doc] = None
+                    self.removed += 1
+            for path in added:
+                self._add(path)
+            rebuild = self.removed > len(self.ids)
+            self._last = ("", None)
+            self._texts = None
+        if rebuild:
+            # Mostly tombstones now, so compact
+            self.build(list(self.ids))
+
+    def search(self, text, limit=200):
+        query = normalize(text)
+        if len(query) < MIN_QUERY:
+            return []
+        words = query.split()
+        with self._lock:
+            last_query, last_matches = self._last
+            if last_matches is not None and query.startswith(last_query):
+                # Typing ahead only narrows the previous result set
+                candidates = last_matches
+            else:
+                candidates = self._candidates(words)
+
+            if len(candidates) > SCAN_OVER:
+                matches = self._scan("keys", words[0])
+                for word in words[1:]:
+                    matches = np.intersect1d(matches, self._scan("keys", word), assume_unique=True)
+                matches = matches.tolist()
+            else:
+                keys = self.keys
+                matches = [doc for doc in candidates if keys[doc] is not None and all(w in keys[doc] for w in words)]
+            self._last = (query, matches)
+            # Every match is ranked before the list is cut to `limit`
+            if len(matches) > SCAN_OVER:
+                ranked = self._rank_many(matches, words, limit)
+            else:
+                ranked = heapq.nsmallest(limit, matches, key=lambda doc: self._rank(doc, words))
+            return [self.paths[doc] for doc in ranked]
+
+    def _candidates(self, words):
+        # Unpadded grams so a word may match anywhere inside a name, not just at its start
+        grams = {w[i:i + 3] for w in words for i in range(len(w) - 2)}
+        postings = [self.postings.get(g) for g in grams]
+        if any(p is None for p in postings):
+            return []
+        if not postings:
+            return range(len(self.keys))
+        postings.sort(key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            # Tiny sets are cheaper to verify directly, and near-universal grams barely filter
+            if len(candidates) < 64 or len(posting) > len(self.keys) // 2:
+                break
+            candidates = np.intersect1d(candidates, np.frombuffer(posting, dtype=np.int32), assume_unique=True)
+        return candidates.tolist() if isinstance(candidates, np.ndarray) else candidates
+
+    def _joined(self):
+        # Keys and names each joined into one byte array, every document preceded by "\n", plus where
+        # each document starts. Normalized text is plain ASCII without newlines, and words hold no
+        # spaces, so a hit never spans two documents.
+        if self._texts is None:
+            texts = {}
+            for field, values in (("keys", [k or "" for k in self.keys]), ("names", self.names)):
+                starts = np.zeros(len(values) + 1, dtype=np.int64)
+                np.cumsum(np.fromiter(map(len, values), dtype=np.int64, count=len(values)) + 1, out=starts[1:])
+                text = ("\n" + "\n".join(values)).encode("ascii")
+                texts[field] = (np.frombuffer(text, dtype=np.uint8), starts)
+            self._texts = texts
+        return self._texts
+
+    def _scan(self, field, pattern):
+        # Sorted IDs of the documents whose key (or name) contains pattern; "\n" + word means "starts with"
+        text, starts = self._joined()[field]
+        pattern = pattern.encode("ascii")
+        count = len(text) - len(pattern) + 1
+        if count <= 0:
+            return np.empty(0, dtype=np.int64)
+        found = text[:count] == pattern[0]
+        for i in range(1, len(pattern)):
+            found &= text[i:i + count] == pattern[i]
+        docs = np.searchsorted(starts, np.flatnonzero(found), "right") - 1
+        # Hits come in text order, so repeats within a document are adjacent
+        return docs[np.r_[True, docs[1:] != docs[:-1]]] if len(docs) else docs
+
+    def _rank_many(self, matches, words, limit):
+        # _rank over a big match list, with the tiers taken from whole-index scans of the names
+        docs = np.asarray(matches, dtype=np.int64)
+
+        found = {}
+
+        def having(pattern):
+            if pattern not in found:
+                found[pattern] = np.isin(docs, self._scan("names", pattern), assume_unique=True)
+            return found[pattern]
+
+        contains = np.logical_and.reduce([having(w) for w in words])
+        at_word = np.logical_and.reduce([having(" " + w) | having("\n" + w) for w in words])
+        tier = np.select([having("\n" + words[0]), at_word, contains], [0, 1, 2], 3)
+        _, starts = self._joined()["names"]
+        length = starts[docs + 1] - starts[docs] - 1
+        if len(docs) > limit:
+            # Keep everything up to the limit-th match on (tier, length); the key settles ties there
+            edge = np.lexsort((length, tier))[limit - 1]
+            docs = docs[(tier < tier[edge]) | ((tier == tier[edge]) & (length <= length[edge]))]
+        return sorted(docs.tolist(), key=lambda doc: self._rank(doc, words))[:limit]
+
+    def _rank(self, doc, words):
+        name = self.names[doc]
+        if name.startswith(words[0]):
+            tier = 0
+        elif all(f" {w}" in f" {name}" for w in words):
+            tier = 1  # every word starts a word of the file name
+        elif all(w in name for w in words):
+            tier = 2
+        else:
+            tier = 3  # matched through the folder path
+        return tier, len(name), self.keys[doc]
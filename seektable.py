@@ -0,0 +1,206 @@
+import io
+import os
+import sqlite3
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from pathlib import Path
+import metrics
+from containers import HEAD_BYTES, find_mp3_frame, parse_mp3_header, skip_id3v2
+from metadata import CACHE_DIR
+
+RESOLUTION = 0.25  # seconds between stored seek points
+
+
+class SeekTable:
+    # Sorted (time, byte offset) points. For MP3 `step` is the frame duration, so a seek can walk
+    # forward from the nearest point to the exact frame.
+    __slots__ = ("kind", "step", "times", "offsets")
+
+    def __init__(self, kind, step=0.0, times=None, offsets=None):
+        self.kind = kind
+        self.step = step
+        self.times = times if times is not None else array("d")
+        self.offsets = offsets if offsets is not None else array("q")
+
+    def __len__(self):
+        return len(self.times)
+
+    def add(self, seconds, offset):
+        self.times.append(seconds)
+        self.offsets.append(offset)
+
+    def locate(self, seconds):
+        i = max(0, bisect_right(self.times, seconds) - 1)
+        return self.times[i], self.offsets[i]
+
+    def to_blob(self):
+        return struct.pack("<d", self.step) + self.times.tobytes() + self.offsets.tobytes()
+
+    @classmethod
+    def from_blob(cls, kind, blob):
+        step = struct.unpack("<d", blob[:8])[0]
+        count = (len(blob) - 8) // 16
+        times, offsets = array("d"), array("q")
+        times.frombytes(blob[8:8 + count * 8])
+        offsets.frombytes(blob[8 + count * 8:])
+        return cls(kind, step, times, offsets)
+
+
+# --- Builders ---
+def build_mp3(f, size):
+    head = f.read(HEAD_BYTES)
+    start = skip_id3v2(head)
+    f.seek(start)
+    pos, header = find_mp3_frame(f.read(HEAD_BYTES))
+    offset = start + pos
+    step = header["samples"] / header["sample_rate"]
+    f.seek(offset)
+    frame = f.read(64)
+    # A Xing/Info/VBRI frame carries no audio
+    if b"Xing" in frame or b"Info" in frame or frame[36:40] == b"VBRI":
+        offset += header["frame_size"]
+    f.seek(max(0, size - 128))
+    end = size - 128 if f.read(3) == b"TAG" else size
+
+    table = SeekTable("mp3", step)
+    elapsed = 0.0
+    mark = 0.0
+    while offset + 4 <= end:
+        f.seek(offset)
+        header = parse_mp3_header(f.read(4))
+        if header is None or header["frame_size"] <= 0:
+            break
+        if elapsed >= mark:
+            table.add(elapsed, offset)
+            mark += RESOLUTION
+        offset += header["frame_size"]
+        elapsed += step
+    return table
+
+
+# Only MP3 gets a table: SDL_mixer seeks FLAC and Ogg itself, and cannot start decoding either
+# from the middle of the file without its header blocks
+BUILDERS = {
+    ".mp3": build_mp3,
+}
+
+
+def build(filepath):
+    builder = BUILDERS.get(Path(filepath).suffix.lower())
+    if builder is None:
+        return None
+    with open(filepath, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        try:
+            with metrics.timed("seektable.build"):
+                table = builder(f, size)
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"truncated stream: {e}")
+    return table if len(table) else None
+
+
+def mp3_frame_at(filepath, table, seconds):
+    # Walk frame headers from the nearest stored point to the frame containing `seconds`
+    elapsed, offset = table.locate(seconds)
+    with open(filepath, "rb") as f:
+        while elapsed + table.step <= seconds:
+            f.seek(offset)
+            header = parse_mp3_header(f.read(4))
+            if header is None:
+                break
+            offset += header["frame_size"]
+            elapsed += table.step
+    return elapsed, offset
+
+
+class FileSlice(io.RawIOBase):
+    # The tail of a file from `start` on, presented as a file of its own
+    def __init__(self, path, start):
+        self._file = open(path, "rb")
+        self._start = start
+        self._file.seek(start)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        return self._file.readinto(b)
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._file.seek(self._start + pos)
+        else:
+            self._file.seek(pos, whence)
+        return self._file.tell() - self._start
+
+    def tell(self):
+        return self._file.tell() - self._start
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+class SeekTableCache:
+    def __init__(self, db_path=None, max_entries=2000):
+        self.db_path = Path(db_path) if db_path else CACHE_DIR / "seektables.db"
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        try:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Seek table cache unavailable, using memory: {e}")
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seektables ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, used REAL, kind TEXT, data BLOB)"
+        )
+        self._db.execute("DELETE FROM seektables WHERE kind != 'mp3'")  # left by older versions
+        self._db.commit()
+
+    def get(self, filepath):
+        try:
+            path = str(Path(filepath).resolve())
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime, kind, data FROM seektables WHERE path = ?", (path,)
+            ).fetchone()
+            if row is None or row[0] != st.st_size or row[1] != st.st_mtime_ns:
+                return None
+            self._db.execute("UPDATE seektables SET used = ? WHERE path = ?", (time.time(), path))
+            self._db.commit()
+        return SeekTable.from_blob(row[2], row[3])
+
+    def lookup(self, filepath):
+        table = self.get(filepath)
+        if table is None:
+            table = build(filepath)
+            if table is not None:
+                self.put(filepath, table)
+        return table
+
+    def put(self, filepath, table):
+        path = str(Path(filepath).resolve())
+        st = os.stat(path)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO seektables (path, size, mtime, used, kind, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, time.time(), table.kind, table.to_blob()),
+            )
+            # Keep the most recently used tables only
+            self._db.execute(
+                "DELETE FROM seektables WHERE path IN (SELECT path FROM seektables ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
@@ -0,0 +1,28 @@
+import json
+import os
+from metadata import CACHE_DIR
+
+SESSION_PATH = CACHE_DIR / "session.json"
+
+
+def load():
+    try:
+        with open(SESSION_PATH) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save(**fields):
+    # Merged into what is already stored and swapped in whole, so a crash never leaves half a file
+    data = load()
+    data.update(fields)
+    try:
+        SESSION_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = SESSION_PATH.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, SESSION_PATH)
+    except OSError as e:
+        print(f"Saving session failed: {e}")
@@ -0,0 +1,50 @@
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+from daemon import default_socket
+
+USAGE = """usage: slmpctl.py COMMAND [ARGS]
+
+  status                 what is playing
+  play [PATH]            play a file or folder, or resume
+  pause | stop | next
+  seek SECONDS
+  enqueue PATH...        play these next, in order
+  shuffle folder|library|off
+  loop on|off
+  volume 0-100
+  quit                   stop the daemon
+
+Set SLMP_SOCKET to talk to a daemon started with --socket."""
+
+
+def send(command, args, path=None):
+    with socket.socket(socket.AF_UNIX) as sock:
+        sock.connect(str(path or default_socket()))
+        sock.sendall(json.dumps({"cmd": command, "args": args}).encode() + b"\n")
+        reply = b""
+        while not reply.endswith(b"\n"):
+            data = sock.recv(65536)
+            if not data:
+                break
+            reply += data
+    return json.loads(reply)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
+        print(USAGE)
+        sys.exit(0)
+    command, args = sys.argv[1], sys.argv[2:]
+    if command in ("play", "enqueue"):
+        # The daemon resolves paths from its own working directory
+        args = [str(Path(a).expanduser().resolve()) for a in args]
+    try:
+        reply = send(command, args, os.environ.get("SLMP_SOCKET"))
+    except OSError as e:
+        print(f"Cannot reach the SLMP daemon: {e}")
+        sys.exit(1)
+    print(json.dumps(reply, indent=2))
+    sys.exit(0 if reply.get("ok") else 1)
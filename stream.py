@@ -0,0 +1,92 @@
+import queue
+import subprocess
+import threading
+import time
+import pygame
+
+CHUNK_SECONDS = 0.1
+BUFFER_SECONDS = 2.0  # decoded audio held in memory, however long the file is
+SAMPLE_FORMATS = {-16: "s16le", 16: "u16le", -8: "s8", 8: "u8", 32: "f32le"}
+
+
+class FFmpegStream:
+    # Decodes a file with ffmpeg into a bounded queue of Sound chunks that the owner feeds to a
+    # mixer Channel by calling pump(). When the queue is full the reader blocks, ffmpeg stalls on
+    # its pipe, and memory stays constant. Seeking restarts ffmpeg at the new offset.
+    def __init__(self, path, channel, offset=0.0):
+        self.path = path
+        self.channel = channel
+        frequency, size, channels = pygame.mixer.get_init()
+        self.format = SAMPLE_FORMATS[size]
+        self.frequency = frequency
+        self.channels = channels
+        self.frame_bytes = channels * abs(size) // 8
+        self.chunk_bytes = int(frequency * CHUNK_SECONDS) * self.frame_bytes
+        self.offset = offset
+        self.eof = False
+        self.started_at = None
+        self._process = None
+        self._stop = threading.Event()
+        self.start(offset)
+
+    def start(self, offset):
+        self.close()
+        self.offset = offset
+        self.eof = False
+        self.started_at = None
+        self.chunks = queue.Queue(maxsize=int(BUFFER_SECONDS / CHUNK_SECONDS))
+        self._stop = threading.Event()
+        self._process = subprocess.Popen(
+            ["ffmpeg", "-v", "error", "-nostdin", "-ss", f"{offset:.3f}", "-i", str(self.path), "-vn",
+             "-f", self.format, "-ac", str(self.channels), "-ar", str(self.frequency), "-"],
+            stdout=subprocess.PIPE, stdin=subprocess.DEVNULL,
+        )
+        threading.Thread(target=self._read, args=(self._process, self.chunks, self._stop),
+                         name="ffmpeg-stream", daemon=True).start()
+
+    def close(self):
+        self._stop.set()
+        if self._process:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+        self.channel.stop()
+
+    def _read(self, process, chunks, stop):
+        # The first chunk is short so playback starts as soon as ffmpeg has some audio
+        size = self.chunk_bytes // 4
+        while not stop.is_set():
+            data = process.stdout.read(size)
+            size = self.chunk_bytes
+            data = data[:len(data) // self.frame_bytes * self.frame_bytes]
+            item = pygame.mixer.Sound(buffer=data) if data else None
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if item is None:
+                return
+
+    def pump(self):
+        # Keep one chunk playing and one queued; returns True when audio first starts
+        started = False
+        while not self.eof and (not self.channel.get_busy() or self.channel.get_queue() is None):
+            try:
+                sound = self.chunks.get_nowait()
+            except queue.Empty:
+                break
+            if sound is None:
+                self.eof = True
+            elif self.channel.get_busy():
+                self.channel.queue(sound)
+            else:
+                self.channel.play(sound)
+                if self.started_at is None:
+                    self.started_at = time.time()
+                    started = True
+        return started
+
+    def finished(self):
+        return self.eof and not self.channel.get_busy()
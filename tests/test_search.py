@@ -0,0 +1,47 @@
+import random
+from pathlib import Path
+from search import SCAN_OVER, SearchIndex
+
+WORDS = ["love", "glove", "song", "songbird", "night", "midnight", "blue", "lovely", "go", "gone"]
+ROOT = Path("/music")
+
+
+def library(count=20000, seed=7):
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        artist = " ".join(rng.sample(WORDS, 2))
+        title = " ".join(rng.sample(WORDS, rng.randint(1, 3)))
+        paths.append(ROOT / artist / f"{title} {i}.mp3")
+    return paths
+
+
+def brute(index, query, limit):
+    words = query.split()
+    matches = [doc for doc, key in enumerate(index.keys) if key is not None and all(w in key for w in words)]
+    assert len(matches) > SCAN_OVER or len(words) > 1
+    return [index.paths[doc] for doc in sorted(matches, key=lambda doc: index._rank(doc, words))[:limit]]
+
+
+def check(index, queries, limit=200):
+    for query in queries:
+        assert index.search(query, limit) == brute(index, query, limit), query
+
+
+def test_large_match_sets_rank_like_a_full_sort():
+    index = SearchIndex(ROOT)
+    index.build(library())
+    # Prefix, mid-word, multi-word and folder-only hits, and typing ahead from a previous query
+    check(index, ["lo", "love", "ove", "ong", "night", "igh", "love song", "song love", "ove ong", "go", "gone blue", "blue gone"])
+    check(index, ["lo", "lov", "love", "love s", "love so"], limit=37)
+    # Deep enough that the cut falls past the first tier
+    check(index, ["song love", "blue gone", "ove ong"], limit=3000)
+
+
+def test_removed_tracks_never_match():
+    index = SearchIndex(ROOT)
+    paths = library()
+    index.build(paths)
+    index.update([ROOT / "blue go" / "love 99999.mp3"], paths[::3])
+    check(index, ["lo", "ove", "love song", "go"])
+    assert "midnight song/love glove 0.mp3" not in index.search("love glove 0", limit=len(paths))
@@ -1,18 +1,30 @@
 import tkinter as tk
-from tkinter import ttk
+from tkinter import filedialog, ttk
 from pathlib import Path
-from player import Player
-import pygame
-import random
+from engine import AudioEngine
 import time
 import threading
-from visuals import launch_visual
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+import session
+import playlist
+from prefetch import MetadataPrefetcher
+from library import LibraryIndex
+from listing import Listing, ListingCache, scan_listing, scan_rows, stat_rows
+from playqueue import PlayQueue
+
+# numpy, pygame and the modules built on them load after the first frame is on screen
+STARTUP_FALLBACK_MS = 500  # finish starting even if the window is never mapped
+FRAME_BUDGET = 0.008  # seconds of Tk time spent inserting rows per chunk
+LISTBOX_CHUNK = 256
+PLAYLIST_PREFETCH = 1000  # rows of an open playlist probed for durations beyond the visible ones
+WAVE_COLOR = "#555555"
+PLAYED_COLOR = "#007acc"
 
 
-AUDIO_EXTENSIONS = [".mp3", ".wav", ".flac", ".ogg", ".opus"]
-
 class SLMP:
-    def __init__(self, root):
+    def __init__(self, root, startup_report=False):
         self.root = root
         self.root.title("SLMP - Simple Local Music Player")
         self.root.configure(bg="#1e1e1e")
@@ -20,9 +32,43 @@ class SLMP:
 
         self.hover_time = None
 
-        self.player = Player(on_finish_callback=self.on_track_finished)
-        self.current_dir = Path.home() / "Music"
+        self.startup_report = startup_report
+        self.started = False
+        self.player = AudioEngine(on_finish_callback=self.on_track_finished, autostart=False)
+        music = Path.home() / "Music"
+        saved = session.load()
+        last_dir = saved.get("directory")
+        self.current_dir = Path(last_dir) if last_dir and Path(last_dir).is_dir() else music
         self.file_paths = []
+        self.listing = Listing(self.current_dir)
+        self.durations = {}
+        self.populated = 0
+        self.populate_generation = 0
+        self.next_pick = None
+        self.play_queue = PlayQueue()
+        self.prefetcher = MetadataPrefetcher(self.player.metadata, self.player.seek_tables)
+        self.library = LibraryIndex(music)
+        self.listings = ListingCache(self.read_listing)
+        self.search_index = None
+        self.loudness = None
+        self.duplicates = None
+        self.waveforms = None
+        self.waveform = None
+        self.wave_track = None
+        self.wave_items = []
+        self.played_x = 0
+        self.playhead = None
+        self.search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self.search_results = queue.Queue()
+        self.search_generation = 0
+        self.searching = False
+        self.analyzer = None
+        self.visuals = None
+        self.watcher = None
+        self.watched_dir = None
+        self.playlist = None
+        self.resume = None  # (track, seconds) to seek to when the restored queue starts playing
+        self.folder_changes = queue.Queue()
 
         self.scroll_index = 0
         self.scroll_direction = 1  # 1 = forward, -1 = backward
@@ -39,11 +85,86 @@ class SLMP:
             "current_track": None,
             "volume": 100,
             "muted": False,
+            "gapless": True,
+            "shuffle_scope": "folder",
+            "skip_duplicates": bool(saved.get("skip_duplicates")),
         }
 
         self.setup_ui()
-        self.load_files()
+        self.load_files(snapshot=True)
+        metrics.mark("listing")
         self.update_status_bar()
+        self.poll_prefetch()
+        self.poll_player()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.bind("<Map>", self.on_map, add="+")
+        self.root.after(STARTUP_FALLBACK_MS, self.finish_startup)
+        metrics.mark("window")
+
+    def on_map(self, event):
+        if event.widget is self.root and not self.started:
+            metrics.mark("first_frame")
+            self.root.after_idle(self.finish_startup)
+
+    def finish_startup(self):
+        # Everything the first frame does not need: the mixer, numpy-backed caches and the library scan
+        if self.started:
+            return
+        self.started = True
+        from search import SearchIndex
+        from loudness import LoudnessAnalyzer
+        from waveform import WaveformCache
+        from watcher import FolderWatcher
+        from duplicates import DuplicateFinder
+        self.player.start()
+        self.search_index = SearchIndex(self.library.root)
+        self.loudness = LoudnessAnalyzer(self.player.loudness, self.player.metadata)
+        self.waveforms = WaveformCache()
+        self.duplicates = DuplicateFinder()
+        self.watcher = FolderWatcher()
+        self.watch_folder(None if self.searching else self.listing.directory)
+        self.update_progress()
+        self.poll_folder_changes()
+        self.run_in_background(playlist.load_queue, self.restore_queue)
+        threading.Thread(target=self.scan_library, daemon=True).start()
+        metrics.mark("ready")
+        self.root.after(100, self.report_startup)
+
+    def report_startup(self):
+        # The mixer comes up on the engine thread, report once it has
+        if self.player.player is None:
+            self.root.after(100, self.report_startup)
+            return
+        report = metrics.startup_report()
+        metrics.trace("startup", report=report)
+        if self.startup_report:
+            print(report)
+
+    def scan_library(self):
+        # Index what the last session saw, then let the scan feed in only the differences
+        self.search_index.build(self.library.tracks())
+        self.library.listeners.append(self.search_index.update)
+        self.library.scan()
+        self.library.watch(self.watcher)
+        self.library.annotate(self.player.metadata)
+        try:
+            self.duplicates.find(self.library.files())
+        except Exception as e:
+            print(f"Duplicate search failed: {e}")
+        self.loudness.start(self.library.tracks())
+
+    def on_close(self):
+        session.save(directory=str(self.current_dir), skip_duplicates=self.state["skip_duplicates"])
+        if self.playlist is not None:
+            elapsed = 0.0 if self.state["stopped"] else self.player.get_elapsed()
+            playlist.save_queue(self.playlist, self.state["current_index"], elapsed)
+        else:
+            playlist.forget_queue()
+        if self.loudness:
+            self.loudness.shutdown()
+        if self.visuals:
+            self.visuals.stop()
+        self.root.destroy()
 
     def setup_ui(self):
         top_bar = tk.Frame(self.root, bg="#1e1e1e")
@@ -59,13 +180,43 @@ class SLMP:
         self.visual_selector.pack(side=tk.RIGHT)
         self.visual_selector.bind("<<ComboboxSelected>>", self.on_visual_selected)
 
+        self.playlist_button = tk.Menubutton(top_bar, text="Playlist", bg="#3c3c3c", fg="#d4d4d4", relief=tk.FLAT)
+        menu = tk.Menu(self.playlist_button, tearoff=0)
+        menu.add_command(label="Open…", command=self.open_playlist)
+        menu.add_command(label="Save as…", command=self.save_playlist)
+        menu.add_command(label="Remove duplicates", command=self.dedup_playlist)
+        menu.add_command(label="Close", command=self.close_playlist)
+        self.playlist_button.config(menu=menu)
+        self.playlist_button.pack(side=tk.RIGHT, padx=(0, 10))
+
+        self.library_button = tk.Menubutton(top_bar, text="Library", bg="#3c3c3c", fg="#d4d4d4", relief=tk.FLAT)
+        menu = tk.Menu(self.library_button, tearoff=0)
+        self.skip_duplicates_var = tk.BooleanVar(value=self.state["skip_duplicates"])
+        menu.add_checkbutton(label="Skip duplicate copies in shuffle", variable=self.skip_duplicates_var, command=self.toggle_skip_duplicates)
+        menu.add_command(label="Duplicate report…", command=self.show_duplicates)
+        self.library_button.config(menu=menu)
+        self.library_button.pack(side=tk.RIGHT, padx=(0, 10))
+
+        self.search_var = tk.StringVar()
+        self.search_entry = tk.Entry(top_bar, textvariable=self.search_var, bg="#3c3c3c", fg="#d4d4d4", insertbackground="#d4d4d4", relief=tk.FLAT, width=24)
+        self.search_entry.pack(side=tk.RIGHT, padx=(0, 10))
+        self.search_entry.bind("<Escape>", lambda e: self.search_var.set(""))
+        self.search_var.trace_add("write", lambda *args: self.on_search_changed())
+        self.root.bind("<Control-f>", lambda e: self.search_entry.focus_set())
+
         self.file_listbox = tk.Listbox(self.root, bg="#1e1e1e", fg="#d4d4d4", selectbackground="#3c3c3c", highlightbackground="#3c3c3c", relief=tk.FLAT, font=("TkDefaultFont", 14))
         self.file_listbox.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         self.file_listbox.bind("<Double-Button-1>", self.on_file_double_click)
+        self.file_listbox.bind("<<ListboxSelect>>", self.on_listbox_select)
+        self.file_listbox.bind("<Alt-Up>", lambda e: self.move_playlist_row(-1))
+        self.file_listbox.bind("<Alt-Down>", lambda e: self.move_playlist_row(1))
+        self.file_listbox.bind("<Delete>", lambda e: self.remove_playlist_row())
 
         controls = tk.Frame(self.root, bg="#1e1e1e")
         controls.pack(pady=5, padx=10, anchor="w")
 
+        tk.Button(controls, text="⏮", command=lambda: self.apply_state("previous"), bg="#3c3c3c", fg="#d4d4d4").pack(side=tk.LEFT, padx=5)
+
         self.play_button = tk.Button(controls, text="▶ Play", command=lambda: self.apply_state("playpause"), bg="#3c3c3c", fg="#d4d4d4", width=8)
         self.play_button.pack(side=tk.LEFT, padx=5)
 
@@ -74,6 +225,7 @@ class SLMP:
 
         self.shuffle_button = tk.Button(controls, text="🔀 Shuffle", command=lambda: self.apply_state("shuffle"), bg="#3c3c3c", fg="#d4d4d4")
         self.shuffle_button.pack(side=tk.LEFT, padx=5)
+        self.shuffle_button.bind("<Button-3>", lambda e: self.toggle_shuffle_scope())
 
         tk.Button(controls, text="⏹ Stop", command=lambda: self.apply_state("stop"), bg="#3c3c3c", fg="#d4d4d4").pack(side=tk.LEFT, padx=5)
 
@@ -89,6 +241,7 @@ class SLMP:
         self.progress_canvas.bind("<Button-1>", self.on_progress_click)
         self.progress_canvas.bind("<Motion>", self.on_progress_hover)
         self.progress_canvas.bind("<Leave>", self.on_progress_leave)
+        self.progress_canvas.bind("<Configure>", lambda e: self.draw_waveform())
 
 
         self.status_frame = tk.Frame(self.root, bg="#1e1e1e")
@@ -100,21 +253,391 @@ class SLMP:
         self.status_label = tk.Label(self.status_frame, text="00:00 / 00:00", anchor="e", bg="#1e1e1e", fg="#d4d4d4", font=("TkDefaultFont", 14))
         self.status_label.pack(side=tk.RIGHT)
 
-    def load_files(self):
+    def load_files(self, keep_playing=False, snapshot=False):
+        started = time.perf_counter()
+        self.playlist = None
+        if self.search_var.get():
+            # Browsing a folder ends the search
+            self.searching = False
+            self.search_var.set("")
+
+        listing = None
+        if snapshot and not self.library.is_current(self.current_dir):
+            # At startup paint what the last scan stored and check it once the window is up
+            listing = self.library.snapshot(self.current_dir)
+            if listing is not None:
+                self.root.after(STARTUP_FALLBACK_MS, self.refresh_listing, listing)
+        if listing is None:
+            listing = self.listings.get(self.current_dir)
+
+        self.up_label.config(text="⬆ Up one level ..", state="normal" if self.current_dir.parent != self.current_dir else "disabled")
+        self.show_listing(listing, keep_playing)
+        metrics.observe("ui.load_files", time.perf_counter() - started)
+        # Warm the likely next hop
+        if self.current_dir.parent != self.current_dir:
+            self.listings.prefetch(self.current_dir.parent)
+
+    def read_listing(self, directory):
+        # Any thread: the library's stored rows while they are current, otherwise a scan
+        listing = self.library.list_dir(directory)
+        if listing is None:
+            metrics.count("listing.scan")
+            with metrics.timed("listing.scan"):
+                listing = scan_listing(directory)
+        return listing
+
+    def on_listbox_select(self, event):
+        selection = self.file_listbox.curselection()
+        if selection and not self.searching and self.listing.is_dir[selection[0]]:
+            self.listings.prefetch(self.file_paths[selection[0]])
+
+    def show_listing(self, listing, keep_playing=False):
         self.file_listbox.delete(0, tk.END)
-        self.file_paths = []
+        self.listing = listing
+        self.file_paths = listing.paths
+        self.populated = 0
+        self.populate_generation += 1
+
+        if keep_playing:
+            track = self.state["current_track"]
+            self.state["current_index"] = listing.index(track) if track else None
+            self.next_pick = None
+        else:
+            self.apply_state("stop")
+        self.populate_listbox(self.populate_generation)
+        self.start_prefetch()
+        self.watch_folder(None if self.searching or self.playlist is not None else listing.directory)
+
+    # --- Live folder updates ---
+    def watch_folder(self, directory):
+        if self.watcher is None or directory == self.watched_dir:
+            return
+        if self.watched_dir is not None:
+            self.watcher.unwatch(self.watched_dir, self.on_folder_changed)
+        self.watched_dir = directory
+        if directory is not None:
+            self.watcher.watch(directory, self.on_folder_changed)
+
+    def on_folder_changed(self, directory, names, renames):
+        # Watcher thread: stat the changed entries here so the Tk side only edits rows
+        try:
+            if names is None:
+                rows, full = {row[0]: row for row in scan_rows(directory)}, True
+            else:
+                rows, full = stat_rows(directory, names), False
+        except (FileNotFoundError, NotADirectoryError):
+            rows, full = None, True  # the folder itself was deleted or moved away
+        except OSError:
+            return
+        self.folder_changes.put((directory, rows, full, renames))
 
-        for item in sorted(self.current_dir.iterdir()):
-            if item.suffix.lower() in AUDIO_EXTENSIONS or item.is_dir():
-                label = f"  📁 {item.name}" if item.is_dir() else f"  {item.name}"
-                self.file_listbox.insert(tk.END, label)
-                self.file_paths.append(item)
+    def poll_folder_changes(self):
+        while True:
+            try:
+                change = self.folder_changes.get_nowait()
+            except queue.Empty:
+                break
+            self.apply_folder_changes(*change)
+        self.root.after(100, self.poll_folder_changes)
+
+    def apply_folder_changes(self, directory, rows, full, renames):
+        listing = self.listing
+        if self.searching or self.playlist is not None or directory != listing.directory:
+            return
+        if rows is None:
+            # Show the nearest folder that still exists
+            parent = directory.parent
+            while not parent.is_dir() and parent.parent != parent:
+                parent = parent.parent
+            self.current_dir = parent
+            self.load_files(keep_playing=not self.state["stopped"])
+            return
+        if full:
+            for name in listing.names:
+                rows.setdefault(name, None)
+        track = self.state["current_track"]
+        previous = self.state["current_index"]
+        added = []
+        for name, row in sorted(rows.items()):
+            index = listing.find(name)
+            if row is None:
+                if index is None:
+                    continue
+                listing.remove(index)
+                if index < self.populated:
+                    self.file_listbox.delete(index)
+                    self.populated -= 1
+            elif index is None:
+                index = listing.insert(*row)
+                # Rows past the populated range are picked up by populate_listbox
+                if index < self.populated or self.populated == len(listing) - 1:
+                    self.file_listbox.insert(index, self.format_label(index))
+                    self.populated += 1
+                if not row[1]:
+                    added.append(listing.paths[index])
+            elif not row[1]:
+                listing.size[index], listing.mtime[index] = row[2], row[3]
+        metrics.count("listing.live_update")
+
+        # The playing file keeps its path in the player; a rename only moves its row
+        if track is not None and track.parent == directory and track.name in renames:
+            index = listing.find(renames[track.name])
+        else:
+            index = listing.index(track) if track else None
+        self.state["current_index"] = index
+        if index is None and self.state["stopped"]:
+            self.state["current_track"] = None
+        if index is not None and index != previous and index < self.populated:
+            self.file_listbox.selection_clear(0, tk.END)
+            self.file_listbox.selection_set(index)
+        if self.next_pick is not None and self.next_pick[0] is not None:
+            self.next_pick = (listing.index(self.next_pick[1]), self.next_pick[1])
+        if added:
+            self.prefetcher.add(added)
+
+    def refresh_listing(self, listing):
+        if listing is not self.listing or self.searching:
+            return
+        future = self.search_executor.submit(scan_listing, listing.directory)
+        self.root.after(20, self.poll_refresh, future, listing)
+
+    def poll_refresh(self, future, listing):
+        if not future.done():
+            self.root.after(20, self.poll_refresh, future, listing)
+            return
+        if listing is not self.listing or self.searching:
+            return  # the user moved on meanwhile
+        try:
+            fresh = future.result()
+        except OSError as e:
+            print(f"Refreshing {listing.directory} failed: {e}")
+            return
+        if not fresh.same_rows(listing):
+            self.show_listing(fresh, keep_playing=not self.state["stopped"])
 
-        self.up_label.config(state="normal" if self.current_dir.parent != self.current_dir else "disabled")
-        self.apply_state("stop")
+    # --- Playlists ---
+    def run_in_background(self, work, done, *args):
+        future = self.search_executor.submit(work, *args)
+        self.root.after(20, self.poll_background, future, done)
+
+    def poll_background(self, future, done):
+        if not future.done():
+            self.root.after(20, self.poll_background, future, done)
+            return
+        try:
+            done(future.result())
+        except (OSError, ValueError) as e:
+            print(f"Background task failed: {e}")
+
+    def open_playlist(self):
+        path = filedialog.askopenfilename(
+            title="Open playlist", initialdir=self.current_dir,
+            filetypes=[("Playlists", " ".join(f"*{ext}" for ext in playlist.PLAYLIST_EXTENSIONS)), ("All files", "*")],
+        )
+        if path:
+            self.run_in_background(playlist.load, self.show_playlist, path)
+
+    def restore_queue(self, saved):
+        if saved is not None and self.playlist is None and self.state["stopped"]:
+            queue, index, elapsed = saved
+            self.show_playlist(queue, index)
+            if self.state["current_index"] == index and elapsed:
+                self.resume = (self.state["current_track"], elapsed)
+
+    def show_playlist(self, queue, index=None):
+        self.searching = False
+        if self.search_var.get():
+            self.search_var.set("")
+        self.playlist = queue
+        self.show_listing(playlist.PlaylistView(queue), keep_playing=not self.state["stopped"])
+        if index is not None and 0 <= index < len(queue) and self.state["stopped"]:
+            self.state["current_index"] = index
+            self.state["current_track"] = self.file_paths[index]
+        self.up_label.config(text=f"⬆ Back to folder  ({queue.name}, {len(queue)} tracks)", state="normal")
+
+    def save_playlist(self):
+        path = filedialog.asksaveasfilename(
+            title="Save playlist", initialdir=self.current_dir, defaultextension=".m3u8",
+            filetypes=[("M3U8", "*.m3u8"), ("M3U", "*.m3u"), ("PLS", "*.pls")],
+        )
+        if not path:
+            return
+        queue = self.playlist
+        if queue is None:
+            # Export the folder (or search results) as shown
+            queue = playlist.Playlist(self.listing.directory, self.current_dir.name)
+            for i in self.listing.audio_indices():
+                queue.append(str(self.file_paths[i]))
+        try:
+            playlist.write(queue, path)
+        except OSError as e:
+            print(f"Saving playlist failed: {e}")
+
+    def dedup_playlist(self):
+        if self.playlist is not None and self.playlist.dedup():
+            self.show_playlist(self.playlist)
+
+    def close_playlist(self):
+        if self.playlist is not None:
+            self.load_files(keep_playing=True)
+
+    def move_playlist_row(self, delta):
+        selection = self.file_listbox.curselection()
+        if self.playlist is None or not selection:
+            return "break"
+        index = selection[0]
+        target = index + delta
+        if not 0 <= target < len(self.playlist):
+            return "break"
+        self.listing.swap(index, target)
+        if max(index, target) < self.populated:
+            self.file_listbox.delete(index)
+            self.file_listbox.insert(target, self.format_label(target))
+        elif index < self.populated:
+            # Moved past the rows inserted so far, populate_listbox brings it back
+            self.file_listbox.delete(index)
+            self.populated -= 1
+        current = self.state["current_index"]
+        if current == index:
+            self.state["current_index"] = target
+        elif current == target:
+            self.state["current_index"] = index
+        self.file_listbox.selection_clear(0, tk.END)
+        self.file_listbox.selection_set(target)
+        self.file_listbox.see(target)
+        self.next_pick = None
+        self.queue_next_track()
+        return "break"
+
+    def remove_playlist_row(self):
+        selection = self.file_listbox.curselection()
+        if self.playlist is None or not selection:
+            return
+        index = selection[0]
+        self.playlist.remove(index)
+        self.listing.invalidate()
+        if index < self.populated:
+            self.file_listbox.delete(index)
+            self.populated -= 1
+        current = self.state["current_index"]
+        if current == index:
+            self.state["current_index"] = None
+        elif current is not None and current > index:
+            self.state["current_index"] = current - 1
+        if index < self.populated:
+            self.file_listbox.selection_set(index)
+        self.next_pick = None
+        self.queue_next_track()
+
+    def on_search_changed(self):
+        text = self.search_var.get().strip()
+        self.search_generation += 1
+        if not text:
+            if self.searching:
+                self.searching = False
+                self.load_files(keep_playing=True)
+            return
+        self.search_executor.submit(self.run_search, self.search_generation, text)
+        self.root.after(5, self.poll_search, self.search_generation)
+
+    def run_search(self, generation, text):
+        # Search thread: skip queries the user has already typed past
+        if generation != self.search_generation:
+            return
+        if self.search_index is None:
+            self.search_results.put((generation, []))
+            return
+        try:
+            with metrics.timed("search.query"):
+                results = self.search_index.search(text)
+        except Exception as e:
+            # poll_search waits for an answer to this generation, so always post one
+            print(f"Search failed: {e}")
+            results = []
+        self.search_results.put((generation, results))
+
+    def poll_search(self, generation):
+        if generation != self.search_generation:
+            return
+        results = None
+        while not self.search_results.empty():
+            done, paths = self.search_results.get_nowait()
+            if done == generation:
+                results = paths
+        if results is None:
+            self.root.after(5, self.poll_search, generation)
+            return
+
+        # Results are relative to the index root, so each row shows the folder it lives in
+        listing = Listing(self.library.root)
+        for relative in results:
+            listing.append(relative, False)
+        self.searching = True
+        self.playlist = None
+        self.show_listing(listing, keep_playing=True)
+
+    def populate_listbox(self, generation):
+        # Rows stream in a chunk per frame so huge folders never freeze the window
+        if generation != self.populate_generation:
+            return
+        start = self.populated
+        total = len(self.listing)
+        deadline = time.perf_counter() + FRAME_BUDGET
+        while self.populated < total and time.perf_counter() < deadline:
+            end = min(self.populated + LISTBOX_CHUNK, total)
+            self.file_listbox.insert(tk.END, *[self.format_label(i) for i in range(self.populated, end)])
+            self.populated = end
+
+        index = self.state["current_index"]
+        if index is not None and start <= index < self.populated:
+            self.file_listbox.selection_set(index)
+            self.file_listbox.see(index)
+        if self.populated < total:
+            self.root.after(1, self.populate_listbox, generation)
+
+    def start_prefetch(self):
+        audio = self.listing.audio_indices()
+        # Probe the rows currently on screen first, then the rest of the folder
+        first = self.file_listbox.nearest(0)
+        last = max(self.file_listbox.nearest(self.file_listbox.winfo_height()), first + int(self.file_listbox.cget("height")))
+        visible = [i for i in audio if first <= i <= last]
+        rest = [i for i in audio if i < first or i > last]
+        if self.playlist is not None:
+            rest = rest[:PLAYLIST_PREFETCH]
+        self.prefetcher.start([self.file_paths[i] for i in visible + rest])
+
+    def poll_prefetch(self):
+        batch = self.prefetcher.drain()
+        if batch:
+            selected = set(self.file_listbox.curselection())
+            for path, info in batch:
+                self.durations[path] = info.get("duration") or 0.0
+                index = self.listing.index(path)
+                # Rows not inserted yet pick the duration up when they are
+                if index is not None and index < self.populated:
+                    self.file_listbox.delete(index)
+                    self.file_listbox.insert(index, self.format_label(index))
+                    if index in selected:
+                        self.file_listbox.selection_set(index)
+        self.root.after(100, self.poll_prefetch)
+
+    def format_label(self, index):
+        name = self.listing.names[index]
+        if self.listing.is_dir[index]:
+            return f"  📁 {name}"
+        if self.playlist is not None and not self.listing.is_audio[index]:
+            return f"  ✗ {name}  (missing)"
+        duration = self.durations.get(self.listing.paths[index])
+        if not duration and self.playlist is not None:
+            duration = self.playlist.duration(index)
+        if duration:
+            return f"  {name}  ({self.format_time(int(duration))})"
+        return f"  {name}"
 
     def go_up_one_level(self):
-        if self.current_dir.parent != self.current_dir:
+        if self.playlist is not None:
+            self.close_playlist()
+        elif self.current_dir.parent != self.current_dir:
             self.current_dir = self.current_dir.parent
             self.load_files()
 
@@ -123,10 +646,10 @@ class SLMP:
         if selection:
             index = selection[0]
             path = self.file_paths[index]
-            if path.is_dir():
+            if self.listing.is_dir[index]:
                 self.current_dir = path
                 self.load_files()
-            elif path.suffix.lower() in AUDIO_EXTENSIONS:
+            elif self.listing.is_audio[index]:
                 self.state["current_index"] = index
                 self.state["current_track"] = path
                 self.state["playing"] = True
@@ -138,7 +661,7 @@ class SLMP:
     def update_volume(self, value):
         volume = int(value)
         self.state["volume"] = volume
-        pygame.mixer.music.set_volume(volume / 100)
+        self.player.set_volume(volume / 100)
         if self.state["muted"] and volume > 0:
             self.state["muted"] = False
             self.mute_button.config(text="🔈")
@@ -155,13 +678,13 @@ class SLMP:
     def toggle_mute(self):
         if self.state["muted"]:
             self.volume_slider.set(self.state["volume"])
-            pygame.mixer.music.set_volume(self.state["volume"] / 100)
+            self.player.set_volume(self.state["volume"] / 100)
             self.mute_button.config(text="🔈")
             self.state["muted"] = False
         else:
             self.state["volume"] = self.volume_slider.get()
             self.volume_slider.set(0)
-            pygame.mixer.music.set_volume(0)
+            self.player.set_volume(0)
             self.mute_button.config(text="🔇")
             self.state["muted"] = True
 
@@ -170,8 +693,74 @@ class SLMP:
             width = self.progress_canvas.winfo_width()
             percent = event.x / width
             seek_time = int(percent * self.player.duration)
+            if self.loudness:
+                self.loudness.hold()
             self.player.seek(seek_time)
 
+    def show_waveform(self, track):
+        track = track.resolve() if track else None
+        if track == self.wave_track:
+            return
+        self.wave_track = track
+        self.waveform = self.waveforms.request(track) if track and self.waveforms else None
+        self.draw_waveform()
+
+    def draw_waveform(self):
+        canvas = self.progress_canvas
+        canvas.delete("all")
+        self.wave_items = []
+        self.playhead = None
+        width, height = canvas.winfo_width(), canvas.winfo_height()
+        if self.wave_track is None or width <= 1:
+            return
+        import numpy as np
+        mid = height / 2
+        if self.waveform is not None:
+            edges = np.arange(width) * len(self.waveform) // width
+            lows = np.minimum.reduceat(self.waveform[:, 0], edges) / 128
+            highs = np.maximum.reduceat(self.waveform[:, 1], edges) / 128
+        else:
+            # Flat bar until the envelope has been decoded
+            lows = np.full(width, -0.1)
+            highs = np.full(width, 0.1)
+        # One line per pixel column, so moving the playhead only recolours the columns it crossed
+        for x in range(width):
+            self.wave_items.append(canvas.create_line(x, mid - highs[x] * mid, x, mid - lows[x] * mid + 1, fill=WAVE_COLOR))
+        self.played_x = 0
+        self.playhead = canvas.create_line(0, 0, 0, height, fill="#d4d4d4")
+        self.update_playhead()
+
+    def update_playhead(self):
+        if not self.wave_items:
+            return
+        duration = self.player.duration
+        width = len(self.wave_items)
+        x = min(width, int(self.player.get_elapsed() / duration * width)) if duration > 0 else 0
+        if x == self.played_x:
+            return
+        start, end = sorted((x, self.played_x))
+        color = PLAYED_COLOR if x > self.played_x else WAVE_COLOR
+        for item in self.wave_items[start:end]:
+            self.progress_canvas.itemconfig(item, fill=color)
+        self.played_x = x
+        self.progress_canvas.coords(self.playhead, x, 0, x, self.progress_canvas.winfo_height())
+
+    def update_progress(self):
+        while True:
+            try:
+                path, peaks = self.waveforms.results.get_nowait()
+            except queue.Empty:
+                break
+            if path == self.wave_track:
+                self.waveform = peaks
+                self.draw_waveform()
+        if not self.state["stopped"]:
+            self.update_playhead()
+            shown = self.hover_time if self.hover_time is not None else self.player.get_elapsed()
+            total = self.player.duration
+            self.status_label.config(text=f"{int(shown // 60):02}:{int(shown % 60):02} / {int(total // 60):02}:{int(total % 60):02}")
+        self.root.after(50, self.update_progress)
+
     def update_status_bar(self):
         if self.state["current_track"]:
             name = self.state["current_track"].name
@@ -203,40 +792,137 @@ class SLMP:
         secs = seconds % 60
         return f"{minutes:02}:{secs:02}"
 
+    def poll_player(self):
+        self.player.poll()
+        self.root.after(20, self.poll_player)
+
     def on_track_finished(self):
         if self.state["stopped"]:
             self.state["stopped"] = False
             return
 
-        if self.state["loop"] and self.state["current_track"]:
-            # Replay same track
-            self.state["playing"] = True
-            self.state["paused"] = False
-        elif self.state["shuffle"]:
-            index = random.randint(0, len(self.file_paths) - 1)
-            self.state["current_index"] = index
-            self.state["current_track"] = self.file_paths[index]
-            self.state["playing"] = True
-            self.state["paused"] = False
-        else:
-            next_index = (self.state["current_index"] + 1) % len(self.file_paths)
-            self.state["current_index"] = next_index
-            self.state["current_track"] = self.file_paths[next_index]
-            self.state["playing"] = True
-            self.state["paused"] = False
+        index, track = self.peek_next_track()
+        if self.state["shuffle"] and not self.state["loop"]:
+            self.play_queue.next()
+        self.next_pick = None
+        self.state["current_index"] = index
+        self.state["current_track"] = track
+        self.state["playing"] = True
+        self.state["paused"] = False
 
         self.apply_state()
 
+    def peek_next_track(self):
+        # Decided once per track so the gapless queue and on_track_finished agree on shuffle picks
+        if self.next_pick is None:
+            if self.state["loop"] and self.state["current_track"]:
+                # Replay same track
+                self.next_pick = (self.state["current_index"], self.state["current_track"])
+            elif self.state["shuffle"]:
+                # Step over files that went missing since the bag was filled
+                track = self.play_queue.peek()
+                for _ in range(len(self.play_queue)):
+                    if track is None or self.is_playable(track):
+                        break
+                    self.play_queue.next()
+                    track = self.play_queue.peek()
+                self.next_pick = (None, track if track is not None and self.is_playable(track) else None)
+            else:
+                self.next_pick = (None, None)
+                count = len(self.file_paths)
+                start = self.state["current_index"] if self.state["current_index"] is not None else -1
+                for step in range(1, count + 1):
+                    next_index = (start + step) % count
+                    if self.listing.is_audio[next_index]:
+                        self.next_pick = (next_index, self.file_paths[next_index])
+                        break
+        return self.next_pick
+
+    def is_playable(self, track):
+        # Only playlist rows can name files that are gone; each row is checked once and remembered
+        if self.playlist is None:
+            return True
+        index = self.listing.index(track)
+        return index is None or bool(self.listing.is_audio[index])
+
+    def queue_next_track(self):
+        if not self.state["gapless"] or not self.state["playing"] or self.state["loop"]:
+            return
+        _, track = self.peek_next_track()
+        if track:
+            self.player.queue(track)
+            # Have the duration and waveform ready before the mixer switches over
+            self.prefetcher.warm(track)
+            if self.waveforms:
+                self.waveforms.request(track)
+
+    def load_play_queue(self):
+        current = self.state["current_track"]
+        if self.state["shuffle_scope"] == "library" and not self.library.scanning and self.library.count():
+            tracks, scope = self.library.tracks(), None
+        else:
+            tracks, scope = [self.file_paths[i] for i in self.listing.audio_indices()], self.current_dir
+        if self.state["skip_duplicates"] and self.duplicates:
+            tracks = self.duplicates.unique(tracks, keep=current)
+        self.play_queue.load(tracks, scope, current)
+
+    def toggle_skip_duplicates(self):
+        self.state["skip_duplicates"] = self.skip_duplicates_var.get()
+        if self.state["shuffle"]:
+            self.load_play_queue()
+            self.next_pick = None
+            self.queue_next_track()
+
+    def show_duplicates(self):
+        from duplicates import report
+        if self.duplicates is None or self.duplicates.groups is None or self.duplicates.searching:
+            text = "Still searching the library for duplicates, try again in a moment."
+        else:
+            text = report(self.duplicates.groups)
+        window = tk.Toplevel(self.root, bg="#1e1e1e")
+        window.title("Duplicate tracks")
+        window.geometry("700x400")
+        view = tk.Text(window, bg="#1e1e1e", fg="#d4d4d4", relief=tk.FLAT, wrap=tk.NONE)
+        view.insert("1.0", text)
+        view.config(state="disabled")
+        view.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    def toggle_shuffle_scope(self):
+        library = self.state["shuffle_scope"] == "folder"
+        self.state["shuffle_scope"] = "library" if library else "folder"
+        self.shuffle_button.config(text="🔀 Library" if library else "🔀 Shuffle")
+        if self.state["shuffle"]:
+            self.load_play_queue()
+            self.next_pick = None
+
+    def previous_track(self):
+        if self.state["shuffle"]:
+            return self.play_queue.previous()
+        audio = self.listing.audio_indices()
+        if not audio:
+            return None
+        current = self.state["current_index"]
+        earlier = [i for i in audio if current is not None and i < current]
+        return self.file_paths[earlier[-1] if earlier else audio[-1]]
+
     def start_visual(self, mode):
-        threading.Thread(target=launch_visual, args=(mode,), daemon=True).start()
+        if self.visuals is None:
+            from analysis import SpectrumAnalyzer
+            from visual_host import VisualHost
+            self.analyzer = SpectrumAnalyzer(self.player)
+            self.visuals = VisualHost(self.player, self.analyzer)
+        self.visuals.start(mode)
 
     def on_visual_selected(self, event):
         mode = self.visual_selector.get().lower()
-        threading.Thread(target=launch_visual, args=(mode,), daemon=True).start()
+        self.start_visual(mode)
         self.visual_selector.set("Visuals")  # Reset after launch
 
     def apply_state(self, source=None):
-        print(f"DEBUG: apply_state called by '{source}' with state =", self.state)
+        started = time.perf_counter()
+        metrics.count(f"state.{source}")
+        metrics.trace("apply_state", source=source, state=self.state)
+        self.next_pick = None
 
         # Handle intent
         if source == "stop":
@@ -249,11 +935,10 @@ class SLMP:
             self.state["current_track"] = None
 
             # Auto-select top playable file
-            for i, path in enumerate(self.file_paths):
-                if path.is_file() and path.suffix.lower() in AUDIO_EXTENSIONS:
-                    self.state["current_index"] = i
-                    self.state["current_track"] = path
-                    break
+            audio = self.listing.audio_indices()
+            if audio:
+                self.state["current_index"] = audio[0]
+                self.state["current_track"] = self.file_paths[audio[0]]
 
         elif source == "playpause":
             if self.state["stopped"]:
@@ -261,7 +946,7 @@ class SLMP:
                 if selection:
                     index = selection[0]
                     path = self.file_paths[index]
-                    if path.is_file() and path.suffix.lower() in AUDIO_EXTENSIONS:
+                    if self.listing.is_audio[index]:
                         self.state["current_index"] = index
                         self.state["current_track"] = path
                         self.state["playing"] = True
@@ -285,28 +970,35 @@ class SLMP:
 
             if self.state["shuffle"]:  # Only act if shuffle is now ON
                 self.state["loop"] = False
-                valid_files = [f for f in self.file_paths if f.suffix.lower() in AUDIO_EXTENSIONS]
-                if valid_files:
-                    track = random.choice(valid_files)
-                    self.state["current_index"] = self.file_paths.index(track)
+                self.load_play_queue()
+                track = self.play_queue.next()
+                if track:
+                    self.state["current_index"] = None
                     self.state["current_track"] = track
                     self.state["playing"] = True
                     self.state["paused"] = False
                     self.state["stopped"] = False
             # If shuffle is being turned OFF, do not touch current_track or playback state
 
+        elif source == "previous":
+            track = self.previous_track()
+            if track:
+                self.state["current_index"] = None
+                self.state["current_track"] = track
+                self.state["playing"] = True
+                self.state["paused"] = False
+                self.state["stopped"] = False
+
         # Run full DMV audit
         self.reconcile_state()
+        metrics.observe("ui.apply_state", time.perf_counter() - started)
 
     def reconcile_state(self):
         # Track assignment
         if self.state["current_track"] is None and self.state["current_index"] is not None:
             self.state["current_track"] = self.file_paths[self.state["current_index"]]
         elif self.state["current_track"] and self.state["current_index"] is None:
-            try:
-                self.state["current_index"] = self.file_paths.index(self.state["current_track"])
-            except ValueError:
-                self.state["current_index"] = None
+            self.state["current_index"] = self.listing.index(self.state["current_track"])
 
         # Listbox sync
         if self.state["current_index"] is not None:
@@ -330,11 +1022,12 @@ class SLMP:
             self.play_button.config(text="▶ Play")
             self.track_label.config(text="")
             self.status_label.config(text="00:00 / 00:00")
-            self.progress_canvas.delete("all")
+            self.show_waveform(None)
             return
 
         # Always show track info if a track is assigned
         if self.state["current_track"]:
+            self.show_waveform(self.state["current_track"])
             self.track_label.config(text=self.state["current_track"].name)
             elapsed = self.player.get_elapsed()
             total = self.player.duration
@@ -351,8 +1044,15 @@ class SLMP:
                 if self.player.paused:
                     self.player.toggle_pause()
                 elif not self.player.is_playing() or self.player.current_file != self.state["current_track"]:
+                    if self.loudness:
+                        self.loudness.hold()
                     self.player.play(self.state["current_track"], loop=self.state["loop"])
+                    self.play_queue.played(self.state["current_track"])
+                    if self.resume and self.resume[0] == self.state["current_track"]:
+                        self.player.seek(self.resume[1])
+                    self.resume = None
                 self.play_button.config(text="⏸ Pause")
+                self.queue_next_track()
 
         # Track label and status
         if self.state["current_track"]:
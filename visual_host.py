@@ -0,0 +1,131 @@
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+import metrics
+from analysis import NUM_BANDS, AnalysisFrame
+
+# Shared block layout (float64 slots), guarded by a sequence lock in slot 0
+SEQ, POSITION, PLAYING, LEVEL, ONSETS, DURATION = range(6)
+BANDS = 8
+SLOTS = BANDS + NUM_BANDS
+PUBLISH_INTERVAL = 1 / 120
+READ_ATTEMPTS = 8  # a reader that keeps meeting a write in progress falls back to its last snapshot
+
+
+class SharedFrames:
+    # Visual-process view of the block, shaped like SpectrumAnalyzer.latest
+    def __init__(self, state):
+        self.state = state
+        self._onsets = 0.0
+        self._last = np.zeros_like(state)
+
+    def read(self):
+        for _ in range(READ_ATTEMPTS):
+            seq = self.state[SEQ]
+            if not seq % 2:
+                snapshot = self.state.copy()
+                if self.state[SEQ] == seq:
+                    self._last = snapshot
+                    return snapshot
+            time.sleep(0)
+        return self._last
+
+    @property
+    def latest(self):
+        snapshot = self.read()
+        onset = snapshot[ONSETS] > self._onsets
+        self._onsets = snapshot[ONSETS]
+        return AnalysisFrame(snapshot[POSITION], snapshot[LEVEL], snapshot[BANDS:], bool(onset))
+
+
+def visual_process(shm_name, conn, mode):
+    # Spawned children share the parent's resource tracker, so the parent alone unlinks the block
+    shm = shared_memory.SharedMemory(name=shm_name)
+    state = np.ndarray((SLOTS,), dtype=np.float64, buffer=shm.buf)
+    metrics.enable_from_env("visuals")
+    try:
+        from visuals import launch_visual
+        launch_visual(mode, SharedFrames(state), conn)
+    finally:
+        del state
+        shm.close()
+
+
+class VisualHost:
+    # Runs visuals in their own process so rendering never competes with Tk or the mixer.
+    # Control messages go over a pipe: ("mode", name) and ("stop",).
+    def __init__(self, player, analyzer):
+        self.player = player
+        self.analyzer = analyzer
+        self.process = None
+        self.conn = None
+        self.shm = None
+        self.state = None
+
+    def is_running(self):
+        return self.process is not None and self.process.is_alive()
+
+    def start(self, mode):
+        if self.is_running():
+            self.conn.send(("mode", mode))
+            return
+        self.shm = shared_memory.SharedMemory(create=True, size=SLOTS * 8)
+        self.state = np.ndarray((SLOTS,), dtype=np.float64, buffer=self.shm.buf)
+        self.state[:] = 0.0
+        ctx = mp.get_context("spawn")
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=visual_process, args=(self.shm.name, child, mode), daemon=True)
+        self.process.start()
+        self.analyzer.start()
+        threading.Thread(target=self._publish, name="visual-publish", daemon=True).start()
+
+    def stop(self):
+        if not self.is_running():
+            return
+        try:
+            self.conn.send(("stop",))
+        except OSError:
+            pass
+        self.process.join(timeout=2.0)
+        if self.process.is_alive():
+            self.process.terminate()
+
+    def _publish(self):
+        process, state, shm = self.process, self.state, self.shm
+        last = None
+        onsets = 0
+        while process.is_alive():
+            # Everything is read before the write starts, so nothing can leave the sequence odd
+            try:
+                frame = self.analyzer.latest
+                position = self.player.get_elapsed()
+                playing = 1.0 if self.player.is_playing() else 0.0
+                duration = self.player.duration
+            except Exception as e:
+                print(f"Publishing visual state failed: {e}")
+                break
+            if frame is not last and frame.onset:
+                onsets += 1
+            last = frame
+            state[SEQ] += 1
+            try:
+                state[POSITION] = position
+                state[PLAYING] = playing
+                state[DURATION] = duration
+                state[LEVEL] = frame.level
+                state[ONSETS] = onsets
+                state[BANDS:] = frame.bands
+            finally:
+                state[SEQ] += 1
+            time.sleep(PUBLISH_INTERVAL)
+
+        if not self.is_running():
+            self.analyzer.stop()
+        if self.shm is shm:
+            self.state = None
+            self.shm = None
+        del state
+        shm.close()
+        shm.unlink()
@@ -1,161 +1,351 @@
 import pygame
-import random
-import math
+import numpy as np
 import time
+import metrics
 
-# --- Ball Class ---
-class Ball:
-    def __init__(self, x, y, dx, dy, radius, color, generation, immune=False):
-        self.x = x
-        self.y = y
-        self.dx = dx
-        self.dy = dy
-        self.radius = radius
-        self.color = color
-        self.generation = generation
-        self.immune = immune
-        self.spawn_time = time.time() if immune else None  #Always set spawn_time if immune
-
-    def move(self, screen_width, screen_height):
-        self.x += self.dx
-        self.y += self.dy
+MAX_BALLS = 8192
+MAX_PARTICLES = 16384
+BIG_RADIUS = 60
+IMMUNE_SECONDS = 1.0
+PARTICLE_LIFE = 30
+
+rng = np.random.default_rng()
+
+
+# --- Safe Velocity Helper ---
+def safe_velocity(count):
+    return rng.choice([-4.0, -3.0, 3.0, 4.0], count) + rng.uniform(-0.5, 0.5, count)
+
+
+# --- Ball State (struct of arrays, live balls are the first n slots) ---
+class Balls:
+    def __init__(self, capacity=MAX_BALLS):
+        self.capacity = capacity
+        self.n = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.dx = np.zeros(capacity)
+        self.dy = np.zeros(capacity)
+        self.radius = np.zeros(capacity, dtype=np.int32)
+        self.color = np.zeros((capacity, 3), dtype=np.int32)
+        self.generation = np.zeros(capacity, dtype=np.int8)
+        self.immune_until = np.zeros(capacity)
+
+    def add(self, x, y, dx, dy, radius, color, generation, immune_until):
+        count = min(len(x), self.capacity - self.n)
+        if count <= 0:
+            return
+        s = slice(self.n, self.n + count)
+        self.x[s] = x[:count]
+        self.y[s] = y[:count]
+        self.dx[s] = dx[:count]
+        self.dy[s] = dy[:count]
+        self.radius[s] = radius[:count]
+        self.color[s] = color[:count]
+        self.generation[s] = generation[:count]
+        self.immune_until[s] = immune_until[:count]
+        self.n += count
+
+    def keep(self, mask):
+        # Compact the live slots, dropping balls where mask is False
+        count = int(mask.sum())
+        for field in (self.x, self.y, self.dx, self.dy, self.radius, self.color, self.generation, self.immune_until):
+            field[:count] = field[:self.n][mask]
+        self.n = count
+
+    def move(self, width, height, now):
+        n = self.n
+        x, y, dx, dy, r = self.x[:n], self.y[:n], self.dx[:n], self.dy[:n], self.radius[:n]
+        x += dx
+        y += dy
 
         # Bounce off walls with slight randomization
-        if self.x - self.radius <= 0 or self.x + self.radius >= screen_width:
-            self.dx *= -1
-            self.dy += random.uniform(-0.5, 0.5)
-        if self.y - self.radius <= 0 or self.y + self.radius >= screen_height:
-            self.dy *= -1
-            self.dx += random.uniform(-0.5, 0.5)
-
-        # Disable immunity after 5 seconds
-        if self.immune and self.spawn_time and time.time() - self.spawn_time > 1:
-            self.immune = False
-            self.spawn_time = None  # Optional: clear spawn_time once expired
-
-    def draw(self, screen):
-        pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), self.radius)
-
-# --- Particle Class ---
-class Particle:
-    def __init__(self, x, y, dx, dy, color):
-        self.x = x
-        self.y = y
-        self.dx = dx
-        self.dy = dy
-        self.color = color
-        self.life = 30
+        hit_x = (x - r <= 0) | (x + r >= width)
+        hit_y = (y - r <= 0) | (y + r >= height)
+        dx[hit_x] *= -1
+        dy[hit_x] += rng.uniform(-0.5, 0.5, int(hit_x.sum()))
+        dy[hit_y] *= -1
+        dx[hit_y] += rng.uniform(-0.5, 0.5, int(hit_y.sum()))
+        return self.immune_until[:n] > now
+
+
+# --- Particle Ring Buffer ---
+class Particles:
+    def __init__(self, capacity=MAX_PARTICLES):
+        self.capacity = capacity
+        self.head = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.dx = np.zeros(capacity)
+        self.dy = np.zeros(capacity)
+        self.color = np.zeros((capacity, 3), dtype=np.int32)
+        self.life = np.zeros(capacity, dtype=np.int32)
+
+    def add(self, x, y, dx, dy, color):
+        # Oldest particles are overwritten once the ring is full
+        slots = (self.head + np.arange(len(x))) % self.capacity
+        self.x[slots] = x
+        self.y[slots] = y
+        self.dx[slots] = dx
+        self.dy[slots] = dy
+        self.color[slots] = color
+        self.life[slots] = PARTICLE_LIFE
+        self.head = int((self.head + len(x)) % self.capacity)
 
     def move(self):
-        self.x += self.dx
-        self.y += self.dy
-        self.life -= 1
+        alive = self.life > 0
+        self.x[alive] += self.dx[alive]
+        self.y[alive] += self.dy[alive]
+        self.life[alive] -= 1
+        return np.flatnonzero(self.life > 0)
 
-    def draw(self, screen):
-        if self.life > 0:
-            pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), 2)
 
-# --- Safe Velocity Helper ---
-def safe_velocity():
-    v = 0
-    while abs(v) < 1.5:
-        v = random.choice([-4, -3, 3, 4]) + random.uniform(-0.5, 0.5)
-    return v
-
-# --- Spawn a Ball ---
-def spawn_ball(balls, width, height, immune=True):
-    radius = 60
-    dx = safe_velocity()
-    dy = safe_velocity()
-    color = [random.randint(100, 255) for _ in range(3)]
-    x = random.randint(radius, width - radius)
-    y = random.randint(radius, height - radius)
-    balls.append(Ball(x, y, dx, dy, radius, color, generation=0, immune=immune))
+# --- Spawn Balls ---
+def spawn_ball(balls, width, height, immune=True, count=1, now=None):
+    now = time.time() if now is None else now
+    radius = np.full(count, BIG_RADIUS)
+    balls.add(
+        rng.integers(BIG_RADIUS, max(BIG_RADIUS + 1, width - BIG_RADIUS), count).astype(float),
+        rng.integers(BIG_RADIUS, max(BIG_RADIUS + 1, height - BIG_RADIUS), count).astype(float),
+        safe_velocity(count), safe_velocity(count), radius,
+        rng.integers(100, 256, (count, 3)), np.zeros(count),
+        np.full(count, now + IMMUNE_SECONDS if immune else 0.0),
+    )
+
 
 # --- Check and Spawn Big Ball ---
-def check_and_spawn_big_ball(balls, width, height):
-    has_big_ball = any(ball.generation == 0 for ball in balls)
-    if not has_big_ball and len(balls) < 10:
-        spawn_ball(balls, width, height, immune=True)
+def check_and_spawn_big_ball(balls, width, height, now=None):
+    has_big_ball = bool((balls.generation[:balls.n] == 0).any())
+    if not has_big_ball and balls.n < 10:
+        spawn_ball(balls, width, height, immune=True, now=now)
 
-# --- Main Game Loop ---
 
-def ensure_minimum_balls(balls, width, height):
-    if len(balls) < 3:
-        spawn_ball(balls, width, height, immune=True)
+def ensure_minimum_balls(balls, width, height, now=None):
+    if balls.n < 3:
+        spawn_ball(balls, width, height, immune=True, now=now)
+
+
+# --- Collision Detection (uniform grid spatial hash per size class) ---
+NEIGHBOUR_CELLS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+ALL_CELLS = tuple((ox, oy) for ox in (-1, 0, 1) for oy in (-1, 0, 1))
+MIN_CELL_SIZE = 16
+ALL_PAIRS_BALLS = 128  # below this, testing every pair is cheaper than building grids
+
+
+def grid_pairs(x, y, queries, members, cell):
+    # Candidate (query, member) pairs whose cells touch. Any colliding pair of balls no wider
+    # than a cell sits in the same or a neighbouring cell; when queries are the members
+    # themselves, each pair comes out once.
+    same = queries is members
+    mx = np.maximum((x[members] // cell).astype(np.int64) + 1, 1)
+    my = np.maximum((y[members] // cell).astype(np.int64) + 1, 1)
+    qx = mx if same else np.maximum((x[queries] // cell).astype(np.int64) + 1, 1)
+    qy = my if same else np.maximum((y[queries] // cell).astype(np.int64) + 1, 1)
+    # Cells are numbered densely with a free border, so neighbour lookups are plain indexing
+    cols = int(max(mx.max(), qx.max())) + 2
+    rows = int(max(my.max(), qy.max())) + 2
+    keys = mx * rows + my
+    order = np.argsort(keys, kind="stable")
+    cell_counts = np.bincount(keys, minlength=cols * rows)
+    cell_starts = np.cumsum(cell_counts) - cell_counts
+
+    pairs_i, pairs_j = [], []
+    # Half of the 3x3 neighbourhood within one grid, so every cell pair is visited once
+    for ox, oy in NEIGHBOUR_CELLS if same else ALL_CELLS:
+        target = (qx + ox) * rows + (qy + oy)
+        counts = cell_counts[target]
+        total = int(counts.sum())
+        if not total:
+            continue
+        i = np.repeat(np.arange(len(queries)), counts)
+        within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        j = order[np.repeat(cell_starts[target], counts) + within]
+        if same and ox == 0 and oy == 0:
+            keep = i < j
+            i, j = i[keep], j[keep]
+        pairs_i.append(queries[i])
+        pairs_j.append(members[j])
+    return pairs_i, pairs_j
+
+
+def find_collisions(balls, width, height):
+    n = balls.n
+    if n < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    x, y, r = balls.x[:n], balls.y[:n], balls.radius[:n]
+    if n <= ALL_PAIRS_BALLS:
+        i, j = np.triu_indices(n, 1)
+        reach = r[i] + r[j]
+        hit = (x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2 < reach * reach
+        return i[hit], j[hit]
+    # One grid per power-of-two size class, each with cells as wide as its widest ball. Smaller
+    # balls are looked up in every larger class's grid: two balls can only touch across classes
+    # if they are within one of the larger cells of each other.
+    level = np.ceil(np.log2(np.maximum(2 * r, 1) / MIN_CELL_SIZE)).clip(0).astype(np.int64)
+    classes = [(MIN_CELL_SIZE << int(k), np.flatnonzero(level == k)) for k in np.unique(level)]
+    pairs_i, pairs_j = [], []
+    for c, (cell, members) in enumerate(classes):
+        found_i, found_j = grid_pairs(x, y, members, members, cell)
+        pairs_i += found_i
+        pairs_j += found_j
+        if c:
+            smaller = np.concatenate([m for _, m in classes[:c]])
+            found_i, found_j = grid_pairs(x, y, smaller, members, cell)
+            pairs_i += found_i
+            pairs_j += found_j
+
+    if not pairs_i:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    i = np.concatenate(pairs_i)
+    j = np.concatenate(pairs_j)
+    reach = r[i] + r[j]
+    hit = (x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2 < reach * reach
+    return i[hit], j[hit]
 
-def launch_visual(arg=None):
-    pygame.init()
+
+def split_balls(balls, particles, hit, now):
+    # Balls up to generation 2 break into two halves, smaller ones burst into particles
+    gen = balls.generation[:balls.n]
+    splitting = hit[gen[hit] < 3]
+    bursting = hit[gen[hit] >= 3]
+
+    if len(splitting):
+        parents = np.repeat(splitting, 2)
+        count = len(parents)
+        color = np.clip(balls.color[parents] + rng.integers(-30, 31, (count, 3)), 0, 255)
+        children = (
+            balls.x[parents] + rng.integers(-5, 6, count), balls.y[parents] + rng.integers(-5, 6, count),
+            safe_velocity(count), safe_velocity(count), balls.radius[parents] // 2, color,
+            balls.generation[parents] + 1, np.full(count, now + IMMUNE_SECONDS),
+        )
+    else:
+        children = None
+
+    if len(bursting):
+        parents = np.repeat(bursting, 5)
+        count = len(parents)
+        color = np.clip(balls.color[parents] + rng.integers(-50, 51, (count, 3)), 0, 255)
+        particles.add(balls.x[parents], balls.y[parents], rng.uniform(-2, 2, count), rng.uniform(-2, 2, count), color)
+
+    mask = np.ones(balls.n, dtype=bool)
+    mask[hit] = False
+    balls.keep(mask)
+    if children:
+        balls.add(*children)
+
+
+def step(balls, particles, width, height, now):
+    immune = balls.move(width, height, now)
+    alive_particles = particles.move()
+
+    i, j = find_collisions(balls, width, height)
+    # Skip collision if either ball is immune
+    active = ~(immune[i] | immune[j])
+    if active.any():
+        split_balls(balls, particles, np.unique(np.concatenate((i[active], j[active]))), now)
+
+    # Always ensure at least 3 balls
+    ensure_minimum_balls(balls, width, height, now)
+    # Ensure at least one big ball if under 10 total
+    check_and_spawn_big_ball(balls, width, height, now)
+    return alive_particles
+
+
+def draw(screen, balls, particles, alive_particles):
+    circle = pygame.draw.circle
+    for x, y, r, color in zip(balls.x[:balls.n].astype(int).tolist(), balls.y[:balls.n].astype(int).tolist(),
+                              balls.radius[:balls.n].tolist(), balls.color[:balls.n].tolist()):
+        circle(screen, color, (x, y), r)
+    if len(alive_particles):
+        width, height = screen.get_size()
+        px = np.clip(particles.x[alive_particles].astype(int), 1, width - 2)
+        py = np.clip(particles.y[alive_particles].astype(int), 1, height - 2)
+        colors = particles.color[alive_particles]
+        pixels = pygame.surfarray.pixels3d(screen)
+        for ox in (-1, 0, 1):
+            for oy in (-1, 0, 1):
+                pixels[px + ox, py + oy] = colors
+        del pixels
+
+
+# --- Music Reaction ---
+MAX_SPEED = 9.0
+BASE_SPEED = 4.5
+
+
+def react(balls, frame):
+    # Onsets kick every ball, the bass band tints the background
+    n = balls.n
+    speed = np.hypot(balls.dx[:n], balls.dy[:n])
+    if frame.onset:
+        boost = 1.0 + min(0.5, frame.level * 2)
+        balls.dx[:n] *= boost
+        balls.dy[:n] *= boost
+    else:
+        # Relax back towards the resting speed between beats
+        relax = np.where(speed > BASE_SPEED, 0.98, 1.0)
+        balls.dx[:n] *= relax
+        balls.dy[:n] *= relax
+    cap = np.minimum(1.0, MAX_SPEED / np.maximum(speed, 1e-6))
+    balls.dx[:n] *= cap
+    balls.dy[:n] *= cap
+    bass = float(frame.bands[:3].mean())
+    return (10 + int(30 * bass), 10, 30 + int(50 * bass))
+
+
+def draw_blackout(screen, frame):
+    # Screen stays dark; a faint row of band levels along the bottom edge
+    width, height = screen.get_size()
+    bar = width / len(frame.bands)
+    for i, energy in enumerate(frame.bands.tolist()):
+        h = int(energy * height * 0.05)
+        if h:
+            pygame.draw.rect(screen, (25, 25, 40), (int(i * bar) + 1, height - h, int(bar) - 2, h))
+
+
+# --- Main Game Loop ---
+def launch_visual(arg=None, analyzer=None, control=None):
+    # Only the display: the visual runs in its own process and must not open the audio device
+    pygame.display.init()
     screen = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
     clock = pygame.time.Clock()
     width, height = screen.get_size()
 
-    balls = []
-    particles = []
+    balls = Balls()
+    particles = Particles()
 
     # Start with 5 big balls
-    for _ in range(5):
-        spawn_ball(balls, width, height, immune=False)
+    spawn_ball(balls, width, height, immune=False, count=5)
 
     running = True
     while running:
-        screen.fill((10, 10, 30))
+        started = time.perf_counter()
+        # Latest analysis result, None when no analyzer is attached
+        frame = analyzer.latest if analyzer else None
 
         for event in pygame.event.get():
             if event.type in (pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
                 running = False
 
-        # Move and draw balls
-        for ball in balls:
-            ball.move(width, height)
-            ball.draw(screen)
-
-        # Move and draw particles
-        for p in particles:
-            p.move()
-            p.draw(screen)
-        particles = [p for p in particles if p.life > 0]
-
-        # Collision detection
-        new_balls = []
-        removed = set()
-        for i in range(len(balls)):
-            for j in range(i + 1, len(balls)):
-                a, b = balls[i], balls[j]
-                if math.hypot(a.x - b.x, a.y - b.y) < a.radius + b.radius:
-                    # Skip collision if either ball is immune
-                    if a.immune or b.immune:
-                        continue
-
-                    removed.update([i, j])
-                    for ball in (a, b):
-                        if ball.generation < 3:
-                            for _ in range(2):
-                                radius = ball.radius // 2
-                                dx = safe_velocity()
-                                dy = safe_velocity()
-                                offset_x = random.randint(-5, 5)
-                                offset_y = random.randint(-5, 5)
-                                color = [min(255, max(0, c + random.randint(-30, 30))) for c in ball.color]
-                                new_balls.append(Ball(ball.x + offset_x, ball.y + offset_y, dx, dy, radius, color, ball.generation + 1, immune=True))
-                        else:
-                            for _ in range(5):
-                                dx = random.uniform(-2, 2)
-                                dy = random.uniform(-2, 2)
-                                color = [min(255, max(0, c + random.randint(-50, 50))) for c in ball.color]
-                                particles.append(Particle(ball.x, ball.y, dx, dy, color))
-
-        balls = [b for i, b in enumerate(balls) if i not in removed] + new_balls
-
-        # Always ensure at least 3 balls
-        if len(balls) < 3:
-            spawn_ball(balls, width, height, immune=True)
-
-        # Ensure at least one big ball if under 10 total
-        check_and_spawn_big_ball(balls, width, height)
+        # Control messages from the player process
+        while control is not None and control.poll():
+            message = control.recv()
+            if message[0] == "stop":
+                running = False
+            elif message[0] == "mode":
+                arg = message[1]
 
+        if arg == "blackout":
+            screen.fill((0, 0, 0))
+            if frame is not None:
+                draw_blackout(screen, frame)
+        else:
+            screen.fill(react(balls, frame) if frame is not None else (10, 10, 30))
+            alive_particles = step(balls, particles, width, height, time.time())
+            draw(screen, balls, particles, alive_particles)
 
         pygame.display.update()
+        metrics.observe(f"visuals.frame.{arg or 'bouncer'}", time.perf_counter() - started)
         clock.tick(60)
 
     pygame.display.quit()
@@ -163,4 +353,3 @@ def launch_visual(arg=None):
 # --- Run the Game ---
 if __name__ == "__main__":
     launch_visual()
-
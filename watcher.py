@@ -0,0 +1,174 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import selectors
+import struct
+import threading
+import time
+from pathlib import Path
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+QUIET = 0.1  # seconds without new events before a batch is delivered
+MAX_DELAY = 1.0  # a steady stream of events is still delivered this often
+
+
+class FolderWatcher:
+    # One inotify descriptor for every watched folder. Events are coalesced per folder and handed
+    # to callback(directory, names, renames) on the watcher thread: names is the set of entries
+    # that may have changed (None after a queue overflow or when the folder itself went away),
+    # renames maps old to new names for moves within the folder.
+    def __init__(self):
+        self.available = False
+        self._callbacks = {}
+        self._gone = {}  # path -> callbacks of a folder whose watch the kernel dropped, until they are told
+        self._wds = {}
+        self._paths = {}
+        self._pending = {}
+        self._renames = {}
+        self._moves = {}
+        self._first = None
+        self._last = None
+        self._lock = threading.Lock()
+        self._warned = False
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            print(f"Folder watching unavailable: {e}")
+            return
+        if self._fd < 0:
+            print(f"Folder watching unavailable: {os.strerror(ctypes.get_errno())}")
+            return
+        self.available = True
+        threading.Thread(target=self._run, name="watcher", daemon=True).start()
+
+    def watch(self, directory, callback):
+        if not self.available:
+            return False
+        path = str(directory)
+        with self._lock:
+            callbacks = self._callbacks.get(path)
+            if callbacks is not None:
+                if callback not in callbacks:
+                    callbacks.append(callback)
+                return True
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC and not self._warned:
+                    self._warned = True
+                    print("Folder watch limit reached, raise fs.inotify.max_user_watches to watch more")
+                elif error != errno.ENOSPC:
+                    print(f"Watching {path} failed: {os.strerror(error)}")
+                return False
+            self._callbacks[path] = [callback]
+            self._wds[path] = wd
+            self._paths[wd] = path
+        return True
+
+    def unwatch(self, directory, callback):
+        path = str(directory)
+        with self._lock:
+            gone = self._gone.get(path)
+            if gone is not None and callback in gone:
+                gone.remove(callback)
+            callbacks = self._callbacks.get(path)
+            if callbacks is None or callback not in callbacks:
+                return
+            callbacks.remove(callback)
+            if not callbacks:
+                del self._callbacks[path]
+                self._libc.inotify_rm_watch(self._fd, self._wds.pop(path))
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._fd, selectors.EVENT_READ)
+        while True:
+            timeout = None
+            if self._first is not None:
+                timeout = max(0.0, min(self._last + QUIET, self._first + MAX_DELAY) - time.monotonic())
+            if selector.select(timeout):
+                try:
+                    self._read(os.read(self._fd, 64 * 1024))
+                except BlockingIOError:
+                    pass
+                except OSError as e:
+                    print(f"Folder watcher stopped: {e}")
+                    return
+            elif self._first is not None:
+                self._flush()
+
+    def _read(self, data):
+        now = time.monotonic()
+        offset = 0
+        with self._lock:
+            while offset + EVENT.size <= len(data):
+                wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + EVENT.size:offset + EVENT.size + length].split(b"\0", 1)[0])
+                offset += EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost, every folder has to be checked in full
+                    for path in self._callbacks:
+                        self._pending[path] = None
+                    continue
+                path = self._paths.get(wd)
+                if path is None:
+                    continue
+                if mask & IN_IGNORED:
+                    # The watch is gone, but its callbacks still have to hear that the folder went away
+                    del self._paths[wd]
+                    if self._wds.get(path) == wd:
+                        del self._wds[path]
+                        self._gone.setdefault(path, []).extend(self._callbacks.pop(path, ()))
+                        self._pending[path] = None
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    self._pending[path] = None
+                    continue
+                if not name:
+                    continue  # about the folder itself (e.g. IN_ATTRIB from touch), not an entry in it
+                names = self._pending.setdefault(path, set())
+                if names is not None:
+                    names.add(name)
+                if mask & IN_MOVED_FROM:
+                    self._moves[cookie] = (path, name)
+                elif mask & IN_MOVED_TO and cookie in self._moves:
+                    source, old = self._moves.pop(cookie)
+                    if source == path:
+                        self._renames.setdefault(path, {})[old] = name
+            if self._pending:
+                self._first = self._first or now
+                self._last = now
+
+    def _flush(self):
+        with self._lock:
+            pending, renames, gone = self._pending, self._renames, self._gone
+            self._pending, self._renames, self._moves, self._gone = {}, {}, {}, {}
+            self._first = self._last = None
+            callbacks = {}
+            for path in pending:
+                callbacks[path] = list(self._callbacks.get(path, ()))
+                callbacks[path] += [callback for callback in gone.get(path, ()) if callback not in callbacks[path]]
+        for path, names in pending.items():
+            for callback in callbacks[path]:
+                try:
+                    callback(Path(path), names, renames.get(path, {}))
+                except Exception as e:
+                    print(f"Folder watch callback failed: {e}")
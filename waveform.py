@@ -0,0 +1,113 @@
+import hashlib
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+import numpy as np
+import metrics
+from metadata import CACHE_DIR
+
+BINS = 512  # min/max pairs per track, resampled to the canvas width when drawn
+RATE = 8000  # decode rate, plenty for an amplitude envelope
+BLOCK = 400  # samples reduced to one min/max pair while streaming
+SLOTS = 16384  # records in the cache file; a colliding track simply overwrites the slot
+
+RECORD = np.dtype([("key", "<u8"), ("peaks", "i1", (BINS, 2))])
+
+
+def envelope_key(path, st):
+    digest = hashlib.blake2b(f"{path}\0{st.st_size}\0{st.st_mtime_ns}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1  # 0 marks an empty slot
+
+
+def compute_envelope(path):
+    # Streams ffmpeg output so memory stays flat for multi-hour files
+    process = subprocess.Popen(
+        ["ffmpeg", "-v", "error", "-nostdin", "-i", str(path), "-vn", "-f", "s16le", "-ac", "1", "-ar", str(RATE), "-"],
+        stdout=subprocess.PIPE, stdin=subprocess.DEVNULL,
+    )
+    lows, highs = [], []
+    try:
+        while True:
+            data = process.stdout.read(BLOCK * 2 * 256)
+            count = len(data) // (BLOCK * 2)
+            if not count:
+                break
+            blocks = np.frombuffer(data[:count * BLOCK * 2], dtype=np.int16).reshape(count, BLOCK)
+            lows.append(blocks.min(axis=1))
+            highs.append(blocks.max(axis=1))
+    finally:
+        process.kill()
+        process.wait()
+    if not lows:
+        return None
+    lows, highs = np.concatenate(lows), np.concatenate(highs)
+    # Fold the per-block values into BINS buckets
+    edges = np.linspace(0, len(lows), BINS + 1).astype(int)
+    edges = np.minimum(edges[:-1], len(lows) - 1)
+    peaks = np.empty((BINS, 2), dtype=np.int8)
+    peaks[:, 0] = np.minimum.reduceat(lows, edges) // 256
+    peaks[:, 1] = np.maximum.reduceat(highs, edges) // 256
+    return peaks
+
+
+class WaveformCache:
+    # Fixed-size records in one memory-mapped file, addressed by a hash of path, size and mtime,
+    # so a previously seen track is a single slot read with no index lookup and no decoding.
+    def __init__(self, path=None):
+        self.path = Path(path) if path else CACHE_DIR / "waveforms.bin"
+        self.results = queue.Queue()
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._available = shutil.which("ffmpeg") is not None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            mode = "r+" if self.path.exists() and self.path.stat().st_size == SLOTS * RECORD.itemsize else "w+"
+            self._records = np.memmap(self.path, dtype=RECORD, mode=mode, shape=(SLOTS,))
+        except OSError as e:
+            print(f"Waveform cache unavailable, using memory: {e}")
+            self._records = np.zeros(SLOTS, dtype=RECORD)
+        threading.Thread(target=self._run, name="waveform", daemon=True).start()
+
+    def get(self, filepath):
+        try:
+            path = str(Path(filepath).resolve())
+            key = envelope_key(path, os.stat(path))
+        except OSError:
+            return None
+        slot = key % SLOTS
+        if self._records["key"][slot] != key:
+            return None
+        return np.array(self._records["peaks"][slot])
+
+    def request(self, filepath):
+        # Cached envelopes come back immediately, others are decoded in the background
+        peaks = self.get(filepath)
+        if peaks is None and self._available:
+            self._pending.put(Path(filepath))
+        return peaks
+
+    def _run(self):
+        while True:
+            path = self._pending.get()
+            if self.get(path) is not None:
+                continue
+            try:
+                with metrics.timed("waveform.compute"):
+                    peaks = compute_envelope(path)
+                st = os.stat(path)
+            except OSError as e:
+                print(f"Waveform of {path.name} failed: {e}")
+                continue
+            if peaks is None:
+                continue
+            key = envelope_key(str(path.resolve()), st)
+            with self._lock:
+                # Peaks first: the key is what marks the slot valid
+                self._records["peaks"][key % SLOTS] = peaks
+                self._records["key"][key % SLOTS] = key
+                if isinstance(self._records, np.memmap):
+                    self._records.flush()
+            self.results.put((path.resolve(), peaks))